@@ -1,5 +1,5 @@
 import re
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from mcdreforged.api.all import *
 
@@ -43,9 +43,58 @@ class RecordCommandStackConfig(Serializable):
 	]
 
 
+class StorageConfig(Serializable):
+	backend: str = 'file'  # file, journal, sqlite, binary, sharded
+	journal_file: str = 'command_stacks.journal'
+	journal_compact_threshold: int = 1000
+	sqlite_file: str = 'command_stacks.db'
+	binary_file: str = 'command_stacks.acsb'
+	shard_folder: str = 'command_stacks'
+	shard_load_workers: int = 4
+	flush_interval: float = 0  # seconds between write-behind flushes, 0 saves on every mutation
+	flush_max_mutations: int = 100
+	background_save: bool = True
+	fsync: str = 'snapshot'  # always, snapshot, never
+	hot_reload_interval: float = 5  # seconds between checks for external edits, 0 disables
+
+
+class SendExecutorConfig(Serializable):
+	loop_count: int = 4
+	max_running_sends: int = 32
+	max_pending_sends: int = 256
+
+
+class PlayerPacingConfig(Serializable):
+	mode: str = 'window'  # fixed, window, ack
+	window_size: int = 8  # /player commands sent in one tick in window mode
+
+
+class SendLimitConfig(Serializable):
+	max_depth: int = 32  # most nested sends, 0 for no limit
+	max_fan_out: int = 1000  # most stacks sent by one send including nested and async ones, 0 for no limit
+
+
+class CommandQueueConfig(Serializable):
+	commands_per_second: float = 0  # 0 disables the limit, a tick is 1/20 second at normal speed
+	burst: int = 20
+	default_priority: int = 0
+	stack_priorities: Dict[str, int] = {}  # stacks with higher priority send their commands first
+
+
+class CommandBatchConfig(Serializable):
+	default_size: int = 1  # most consecutive MC commands sent in one write, 1 disables batching
+	stack_sizes: Dict[str, int] = {}
+
+
 class Config(Serializable):
 	prefix: str = '!!ac'
 	command_stack_storage_file: str = 'command_stacks.json'
+	storage: StorageConfig = StorageConfig()
+	send_executor: SendExecutorConfig = SendExecutorConfig()
+	send_limit: SendLimitConfig = SendLimitConfig()
+	player_pacing: PlayerPacingConfig = PlayerPacingConfig()
+	command_queue: CommandQueueConfig = CommandQueueConfig()
+	command_batch: CommandBatchConfig = CommandBatchConfig()
 	on_server_start_sends: str = 'server_start'
 	stack_per_page: int = 10
 	tick_data_getter: TickDataGetterConfig = TickDataGetterConfig()
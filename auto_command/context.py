@@ -4,18 +4,23 @@ from auto_command.mcdr.mcdr_service import Service
 from auto_command.config import Config
 from auto_command.utils import Utils
 from auto_command.tools.tick_data_getter import TickDataGetter
+from auto_command.tools.tick_clock import TickClock
 from auto_command.tools.ac_time import ACTime
 from auto_command.tools.info_getter import InfoGetter
+from auto_command.tools.execution_plan import ExecutionPlanCache
 
 
 class Context:
     def __init__(self, server: PluginServerInterface):
         self._svc = Service(server)
         self._cfg = Config.get(self.svc)
+        self._svc.set_command_rate(self._cfg.command_queue.commands_per_second, self._cfg.command_queue.burst)
         self._utils = Utils(self._svc, self._cfg)
         self._tick_data_getter = TickDataGetter(self._svc, self._cfg.tick_data_getter)
         self._info_getter = InfoGetter(self._svc)
-        self._time = ACTime(self._tick_data_getter)
+        self._tick_clock = TickClock(self._tick_data_getter, self._svc.log_warning)
+        self._time = ACTime(self._tick_clock)
+        self._plan_cache = ExecutionPlanCache(self._cfg.prefix)
 
     @property
     def svc(self):
@@ -33,6 +38,10 @@ class Context:
     def tick_data_getter(self):
         return self._tick_data_getter
 
+    @property
+    def tick_clock(self):
+        return self._tick_clock
+
     @property
     def info_getter(self):
         return self._info_getter
@@ -40,3 +49,7 @@ class Context:
     @property
     def time(self):
         return self._time
+
+    @property
+    def plan_cache(self):
+        return self._plan_cache
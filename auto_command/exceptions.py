@@ -47,6 +47,22 @@ class ACUnknownStackException(ACExceptionBase):
         return f'Unknown command stack "{self._name}"'
 
 
+class ACUnknownSendException(ACExceptionBase):
+    def __init__(self, send_id: int):
+        self._send_id = send_id
+
+    @property
+    def translation_key(self) -> str:
+        return 'fail_msg.unknown_send'
+
+    @property
+    def args(self) -> tuple:
+        return (self._send_id,)
+
+    def __str__(self):
+        return f'Unknown running send #{self._send_id}'
+
+
 class ACStackExistsException(ACExceptionBase):
     def __init__(self, name: str):
         self._name = name
@@ -102,6 +118,39 @@ class ACRecursionException(ACExceptionBase):
         return f'Detected recursion in command stack "{self._name}"'
 
 
+class ACSendDepthException(ACExceptionBase):
+    def __init__(self, max_depth: int, chain: List[str]):
+        self._max_depth = max_depth
+        self._chain = chain
+
+    @property
+    def translation_key(self) -> str:
+        return 'fail_msg.send_depth'
+
+    @property
+    def args(self) -> tuple:
+        return self._max_depth, ' -> '.join(self._chain)
+
+    def __str__(self):
+        return f'Nested sends exceed the max depth {self._max_depth}: {" -> ".join(self._chain)}'
+
+
+class ACSendFanOutException(ACExceptionBase):
+    def __init__(self, max_fan_out: int):
+        self._max_fan_out = max_fan_out
+
+    @property
+    def translation_key(self) -> str:
+        return 'fail_msg.send_fan_out'
+
+    @property
+    def args(self) -> tuple:
+        return (self._max_fan_out,)
+
+    def __str__(self):
+        return f'One send could not send more than {self._max_fan_out} command stacks'
+
+
 class ACTimeFormatMismatchException(ACExceptionBase):
     def __init__(self, time: str):
         self._time = time
@@ -44,6 +44,14 @@ class CommandManager:
                 then(
                     QuotableText('name').
                     runs(lambda src, ctx: self._tm.send_command_stack(src, ctx['name'])).
+                    then(
+                        Literal('trace').
+                        runs(lambda src, ctx: self._tm.send_command_stack(src, ctx['name'], trace=True)).
+                        then(
+                            Literal('dry').
+                            runs(lambda src, ctx: self._tm.send_command_stack(src, ctx['name'], dry_run=True))
+                        )
+                    ).
                     then(
                         Literal('async').
                         then(
@@ -77,6 +85,17 @@ class CommandManager:
                     )
                 )
             ).
+            then(
+                Literal('running').
+                runs(self._tm.list_running_sends)
+            ).
+            then(
+                Literal('cancel').
+                then(
+                    Integer('id').at_min(1).
+                    runs(lambda src, ctx: self._tm.cancel_send(src, ctx['id']))
+                )
+            ).
             then(
                 Literal('make').
                 then(
@@ -183,6 +202,13 @@ class CommandManager:
                     runs(lambda src, ctx: self._tm.print_wait_help(src, ctx['time']))
                 )
             ).
+            then(
+                Literal('parallel').
+                then(
+                    GreedyText('stacks').
+                    runs(lambda src, ctx: self._tm.print_parallel_help(src))
+                )
+            ).
             then(
                 Literal('white').
                 then(
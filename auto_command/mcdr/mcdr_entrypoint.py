@@ -3,22 +3,24 @@ from typing import Callable
 from mcdreforged.api.all import *
 
 from auto_command.context import Context
-from auto_command.storage.storage import CommandStackStorageFactory
+from auto_command.storage.storage import CommandStackStorageFactory, CommandStackStorage
 from auto_command.task.task_manager import TaskManager
 from auto_command.mcdr.mcdr_command import CommandManager
 
 
 _task_manager: TaskManager
 _ctx: Context
+_cmd_stack_storage: CommandStackStorage
 debug_loger: Callable[[str], None]
 
 
 def on_load(server: PluginServerInterface, old):
-    global _task_manager, _ctx, debug_loger
+    global _task_manager, _ctx, _cmd_stack_storage, debug_loger
 
     _ctx = Context(server)
     debug_loger = _ctx.svc.log_info
     cmd_stack_storage = CommandStackStorageFactory(_ctx).get_command_stack_storage()
+    _cmd_stack_storage = cmd_stack_storage
     _task_manager = TaskManager(_ctx, cmd_stack_storage)
     cmd_manager = CommandManager(_ctx, _task_manager)
 
@@ -28,6 +30,7 @@ def on_load(server: PluginServerInterface, old):
     _task_manager.check_perm_stacks()
 
     cmd_manager.construct_command_tree()
+    _task_manager.start_hot_reload()
 
     if server.is_server_startup():
         _task_manager.reset_timed_stacks()
@@ -48,8 +51,18 @@ def on_server_startup(server: PluginServerInterface):
 
 
 def on_unload(server: PluginServerInterface):
+    _task_manager.stop_hot_reload()
     _task_manager.stop_timed_stacks()
+    _task_manager.stop_sending()
+    _ctx.svc.close_command_queue()
+    _cmd_stack_storage.flush()
+    _cmd_stack_storage.close()
 
 
 def on_remove(server: PluginServerInterface):
+    _task_manager.stop_hot_reload()
     _task_manager.stop_timed_stacks()
+    _task_manager.stop_sending()
+    _ctx.svc.close_command_queue()
+    _cmd_stack_storage.flush()
+    _cmd_stack_storage.close()
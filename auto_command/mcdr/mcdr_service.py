@@ -1,18 +1,47 @@
-from typing import List, Optional, Type, Callable, Any, Union
+from concurrent.futures import Future
+from typing import List, Optional, Type, Callable, Any, Union, Sequence
 
 from mcdreforged.api.all import *
 
 from auto_command.exceptions import ACPermDeniedException
 from auto_command.constant import PLUGIN_ID
+from auto_command.tools.command_queue import CommandQueue, CommandQueueMetrics
 
 
 class Service:
     def __init__(self, server: PluginServerInterface):
         self._server: PluginServerInterface = server
+        self._command_queue: CommandQueue = CommandQueue(self.exec_mc_cmd, 0, 1, self.log_warning)
 
     def exec_mc_cmd(self, command: str):
         self._server.execute(command)
 
+    def is_server_running(self) -> bool:
+        return self._server.is_server_running()
+
+    def set_command_rate(self, commands_per_second: float, burst: int):
+        self._command_queue.close()
+        self._command_queue = CommandQueue(self.exec_mc_cmd, commands_per_second, burst, self.log_warning)
+
+    def queue_mc_cmd(self, command: str, priority: int = 0) -> Future:
+        """
+        Executes command through the rate limited command queue
+        :return: A future done once the command is executed
+        """
+        return self._command_queue.submit(command, priority)
+
+    def queue_mc_cmds(self, commands: Sequence[str], priority: int = 0) -> Future:
+        """
+        Executes commands in one write to the server stdin, each command ends up on its own console line
+        """
+        return self._command_queue.submit('\n'.join(commands), priority, len(commands))
+
+    def command_queue_metrics(self) -> CommandQueueMetrics:
+        return self._command_queue.metrics()
+
+    def close_command_queue(self):
+        self._command_queue.close()
+
     def exec_mcdr_cmd(self, source: CommandSource, command: str):
         self._server.execute_command(command, source)
 
@@ -33,6 +62,9 @@ class Service:
     def log_info(self, msg: str):
         self._server.logger.info(msg)
 
+    def log_warning(self, msg: str):
+        self._server.logger.warning(msg)
+
     def tr(self, translation_key: str, *args) -> RTextMCDRTranslation:
         return self._server.rtr(f'{PLUGIN_ID}.{translation_key}', *args)
 
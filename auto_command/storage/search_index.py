@@ -0,0 +1,108 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def scan(texts: Iterable[Tuple[str, Optional[str]]], keyword: str) -> List[str]:
+    """
+    Names of the (name, desc) pairs that contain the keyword, in the given order
+    """
+    matched_names = []
+    for name, desc in texts:
+        if name.find(keyword) != -1 or (desc is not None and desc.find(keyword) != -1):
+            matched_names.append(name)
+    return matched_names
+
+
+class SearchIndex:
+    """
+    Inverted index from every substring of up to gram_size characters to the stacks whose name or description contains it
+
+    Keywords no longer than gram_size are answered directly by one posting set,
+    longer keywords intersect the postings of their grams and verify the few candidates left.
+    A keyword whose smallest posting holds a large part of the stacks is scanned for instead,
+    sorting or verifying that many candidates is slower than the plain scan
+    """
+
+    _scan_ratio = 0.25
+
+    def __init__(self, gram_size: int = 3):
+        self._gram_size: int = gram_size
+        self._postings: Dict[str, Set[str]] = {}
+        self._texts: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._order: Dict[str, int] = {}
+        self._counter: int = 0
+
+    def _grams(self, text: str) -> Set[str]:
+        grams = set()
+        for size in range(1, self._gram_size + 1):
+            for i in range(len(text) - size + 1):
+                grams.add(text[i:i + size])
+        return grams
+
+    def clear(self):
+        self._postings.clear()
+        self._texts.clear()
+        self._order.clear()
+        self._counter = 0
+
+    def _text_grams(self, name: str, desc: Optional[str]) -> Set[str]:
+        grams = self._grams(name)
+        if desc is not None:
+            grams |= self._grams(desc)
+        return grams
+
+    def _unlink(self, name: str, desc: Optional[str]):
+        for gram in self._text_grams(name, desc):
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    self._postings.pop(gram)
+
+    def add(self, name: str, desc: Optional[str]):
+        # re-adding a name keeps its position in the results, _texts is kept in the same order for scans
+        text = self._texts.get(name)
+        if text is not None:
+            self._unlink(*text)
+        else:
+            self._order[name] = self._counter
+            self._counter += 1
+        for gram in self._text_grams(name, desc):
+            self._postings.setdefault(gram, set()).add(name)
+        self._texts[name] = (name, desc)
+
+    def remove(self, name: str):
+        text = self._texts.pop(name, None)
+        if text is None:
+            return
+        self._order.pop(name)
+        self._unlink(*text)
+
+    def search(self, keyword: str) -> List[str]:
+        scan_size = len(self._texts) * self._scan_ratio
+        if keyword == '':
+            return list(self._texts)
+        elif len(keyword) <= self._gram_size:
+            matched = self._postings.get(keyword, set())
+            if len(matched) > scan_size:
+                return scan(self._texts.values(), keyword)
+        else:
+            postings = []
+            for i in range(len(keyword) - self._gram_size + 1):
+                names = self._postings.get(keyword[i:i + self._gram_size])
+                if names is None:
+                    return []
+                postings.append(names)
+            postings.sort(key=len)
+            if len(postings[0]) > scan_size:
+                return scan(self._texts.values(), keyword)
+            candidates = set(postings[0])
+            for names in postings[1:]:
+                candidates &= names
+                if not candidates:
+                    return []
+            matched = []
+            for name in candidates:
+                _, desc = self._texts[name]
+                if name.find(keyword) != -1 or (desc is not None and desc.find(keyword) != -1):
+                    matched.append(name)
+        return sorted(matched, key=self._order.__getitem__)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+from threading import Condition, Thread
+from typing import Any, Callable, Optional, Union
+
+
+def write_atomic(path: str, content: Union[str, bytes], fsync: bool):
+    """
+    Writes content to a temp file next to path and renames it over path,
+    so readers and crashes only ever see the old or the new file
+    """
+    folder = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content.encode('utf8') if isinstance(content, str) else content)
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    if fsync and hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots on a worker thread, a snapshot submitted while another one is pending replaces it
+    """
+
+    def __init__(self, write: Callable[[Any], None], log_callback: Callable[[str], None], name: str = 'AutoCommand-SnapshotWriter'):
+        self._write = write
+        self._log_callback = log_callback
+        self._name = name
+        self._cond = Condition()
+        self._pending: Optional[Any] = None
+        self._has_pending: bool = False
+        self._writing: bool = False
+        self._closed: bool = False
+        self._thread: Optional[Thread] = None
+
+    def submit(self, snapshot: Any):
+        with self._cond:
+            self._pending = snapshot
+            self._has_pending = True
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = Thread(target=self._thread_main, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._has_pending or self._writing
+
+    def wait(self):
+        """
+        Blocks until every submitted snapshot has been written
+        """
+        with self._cond:
+            while self._has_pending or self._writing:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _thread_main(self):
+        while True:
+            with self._cond:
+                while not self._has_pending and not self._closed:
+                    self._cond.wait()
+                if not self._has_pending:
+                    return
+                snapshot = self._pending
+                self._pending = None
+                self._has_pending = False
+                self._writing = True
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                self._log_callback(f'Fail to write snapshot: {e}')
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
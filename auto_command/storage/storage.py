@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Iterable, Union
 from abc import ABC, abstractmethod
 import os
 
@@ -14,6 +14,50 @@ class CommandStack(Serializable):
     command: List[str] = []
 
 
+class FrozenCommandStack:
+    """
+    Immutable view of a command stack handed out by storage reads, edits create a new instance with replace()
+    """
+
+    __slots__ = ('_desc', '_perm', '_interval', '_command')
+
+    def __init__(self, desc: Optional[str] = None, perm: int = 3, interval: str = '0', command: Iterable[str] = ()):
+        self._desc: Optional[str] = desc
+        self._perm: int = perm
+        self._interval: str = interval
+        self._command: tuple = tuple(command)
+
+    @classmethod
+    def of(cls, stack: Union[CommandStack, 'FrozenCommandStack']) -> 'FrozenCommandStack':
+        if isinstance(stack, FrozenCommandStack):
+            return stack
+        return cls(stack.desc, stack.perm, stack.interval, stack.command)
+
+    @property
+    def desc(self) -> Optional[str]:
+        return self._desc
+
+    @property
+    def perm(self) -> int:
+        return self._perm
+
+    @property
+    def interval(self) -> str:
+        return self._interval
+
+    @property
+    def command(self) -> tuple:
+        return self._command
+
+    def replace(self, **kwargs) -> 'FrozenCommandStack':
+        values = {'desc': self.desc, 'perm': self.perm, 'interval': self.interval, 'command': self.command}
+        values.update(kwargs)
+        return FrozenCommandStack(**values)
+
+    def serialize(self) -> dict:
+        return {'desc': self.desc, 'perm': self.perm, 'interval': self.interval, 'command': list(self.command)}
+
+
 class CommandStackStorage(ABC):
 
     @abstractmethod
@@ -25,7 +69,7 @@ class CommandStackStorage(ABC):
         pass
 
     @abstractmethod
-    def get(self, name: str) -> CommandStack:
+    def get(self, name: str) -> FrozenCommandStack:
         pass
 
     @abstractmethod
@@ -49,7 +93,7 @@ class CommandStackStorage(ABC):
         pass
 
     @abstractmethod
-    def pop_stack(self, name: str) -> CommandStack:
+    def pop_stack(self, name: str) -> FrozenCommandStack:
         pass
 
     @abstractmethod
@@ -80,6 +124,26 @@ class CommandStackStorage(ABC):
     def change_desc(self, name: str, desc: str):
         pass
 
+    def check_external_change(self) -> List[str]:
+        """
+        Picks up edits made to the storage outside of the plugin
+
+        :return: Names of the stacks that were added, removed or changed
+        """
+        return []
+
+    def flush(self):
+        """
+        Writes all pending mutations to disk
+        """
+        pass
+
+    def close(self):
+        """
+        Releases background resources, call flush() first to keep pending mutations
+        """
+        pass
+
 
 class CommandStackStorageFactory:
     def __init__(self, ctx: Context):
@@ -87,6 +151,42 @@ class CommandStackStorageFactory:
         self._svc = ctx.svc
 
     def get_command_stack_storage(self) -> CommandStackStorage:
+        storage_cfg = self._cfg.storage
+        data_folder = self._svc.get_data_folder()
+        file_path = os.path.join(data_folder, self._cfg.command_stack_storage_file)
+        fsync_snapshot = storage_cfg.fsync in ('always', 'snapshot')
+        if storage_cfg.backend == 'journal':
+            from auto_command.storage.storage_journal import CommandStackJournalStorage
+            journal_path = os.path.join(data_folder, storage_cfg.journal_file)
+            return CommandStackJournalStorage(
+                file_path, journal_path, storage_cfg.journal_compact_threshold, self._svc.log_exception,
+                fsync_snapshot=fsync_snapshot, fsync_journal=storage_cfg.fsync == 'always'
+            )
+        if storage_cfg.backend == 'sqlite':
+            from auto_command.storage.storage_sqlite import CommandStackSqliteStorage
+            db_path = os.path.join(data_folder, storage_cfg.sqlite_file)
+            synchronous = {'always': 'FULL', 'snapshot': 'NORMAL'}.get(storage_cfg.fsync, 'OFF')
+            return CommandStackSqliteStorage(db_path, file_path, self._svc.log_exception, synchronous)
+        if storage_cfg.backend == 'binary':
+            from auto_command.storage.storage_binary import CommandStackBinaryStorage
+            binary_path = os.path.join(data_folder, storage_cfg.binary_file)
+            return CommandStackBinaryStorage(
+                binary_path, file_path, self._svc.log_exception,
+                flush_interval=storage_cfg.flush_interval, flush_max_mutations=storage_cfg.flush_max_mutations,
+                fsync=fsync_snapshot, background_save=storage_cfg.background_save
+            )
+        if storage_cfg.backend == 'sharded':
+            from auto_command.storage.storage_sharded import CommandStackShardedStorage
+            folder = os.path.join(data_folder, storage_cfg.shard_folder)
+            return CommandStackShardedStorage(
+                folder, file_path, self._svc.log_exception,
+                load_workers=storage_cfg.shard_load_workers, fsync=fsync_snapshot
+            )
+        if storage_cfg.backend != 'file':
+            self._svc.log_warning(f'Unknown storage backend "{storage_cfg.backend}", fallback to file')
         from auto_command.storage.storage_file import CommandStackFileStorage
-        file_path = os.path.join(self._svc.get_data_folder(), self._cfg.command_stack_storage_file)
-        return CommandStackFileStorage(file_path, self._svc.log_exception)
+        return CommandStackFileStorage(
+            file_path, self._svc.log_exception,
+            flush_interval=storage_cfg.flush_interval, flush_max_mutations=storage_cfg.flush_max_mutations,
+            fsync=fsync_snapshot, background_save=storage_cfg.background_save
+        )
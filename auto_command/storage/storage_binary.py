@@ -0,0 +1,140 @@
+import json
+import os
+import struct
+from typing import Callable, Dict, Optional
+
+from auto_command.storage.storage import FrozenCommandStack
+from auto_command.storage.storage_file import CommandStackFileStorage
+from auto_command.storage.snapshot_writer import write_atomic
+
+# Layout of a binary storage file:
+#   magic        b'ACSB' + format version byte
+#   header_size  big-endian uint32
+#   header       compact json list of [name, desc, perm, interval, offset, length]
+#   body         compact json list of command lines of each stack, located by offset and length
+_MAGIC = b'ACSB\x01'
+_HEADER_SIZE = struct.Struct('>I')
+
+
+class LazyFrozenCommandStack(FrozenCommandStack):
+    """
+    Frozen stack whose command lines are decoded from the raw body on first access
+    """
+
+    __slots__ = ('_raw',)
+
+    def __init__(self, desc: Optional[str], perm: int, interval: str, raw: memoryview):
+        super().__init__(desc, perm, interval)
+        self._command = None
+        self._raw: memoryview = raw
+
+    @property
+    def raw(self) -> memoryview:
+        return self._raw
+
+    @property
+    def command(self) -> tuple:
+        if self._command is None:
+            self._command = tuple(json.loads(bytes(self._raw)))
+        return self._command
+
+
+def encode_stacks(stacks: Dict[str, FrozenCommandStack]) -> bytes:
+    header = []
+    body = bytearray()
+    for name, stack in stacks.items():
+        if isinstance(stack, LazyFrozenCommandStack):
+            # stacks are immutable, so the bytes it was decoded from are still valid
+            blob = stack.raw
+        else:
+            blob = json.dumps(list(stack.command), ensure_ascii=False, separators=(',', ':')).encode('utf8')
+        header.append([name, stack.desc, stack.perm, stack.interval, len(body), len(blob)])
+        body += blob
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf8')
+    return b''.join((_MAGIC, _HEADER_SIZE.pack(len(header_bytes)), header_bytes, body))
+
+
+def decode_stacks(content: bytes) -> Dict[str, FrozenCommandStack]:
+    if content[:len(_MAGIC)] != _MAGIC:
+        raise ValueError('Not a binary command stack file')
+    header_start = len(_MAGIC) + _HEADER_SIZE.size
+    header_size, = _HEADER_SIZE.unpack_from(content, len(_MAGIC))
+    body_start = header_start + header_size
+    header = json.loads(content[header_start:body_start].decode('utf8'))
+    body = memoryview(content)[body_start:]
+    stacks = {}
+    for name, desc, perm, interval, offset, length in header:
+        if offset + length > len(body):
+            raise ValueError(f'Truncated data of command stack "{name}"')
+        stacks[name] = LazyFrozenCommandStack(desc, perm, interval, body[offset:offset + length])
+    return stacks
+
+
+def json_to_binary(json_path: str, binary_path: str, fsync: bool = True):
+    with open(json_path, 'r', encoding='utf8') as handle:
+        stacks = CommandStackFileStorage._parse(handle.read())
+    write_atomic(binary_path, encode_stacks(stacks), fsync)
+
+
+def binary_to_json(binary_path: str, json_path: str, fsync: bool = True):
+    with open(binary_path, 'rb') as handle:
+        stacks = decode_stacks(handle.read())
+    write_atomic(json_path, CommandStackFileStorage._dump(stacks), fsync)
+
+
+class CommandStackBinaryStorage(CommandStackFileStorage):
+    """
+    Stores stacks in the binary layout above, load() only parses the header
+    and each stack's command lines are decoded on first use
+    """
+
+    def __init__(self, file_path: str, json_path: Optional[str], log_callback: Callable[[str], None], **kwargs):
+        super().__init__(file_path, log_callback, **kwargs)
+        self._json_path: Optional[str] = json_path
+        # exists while the json file is not converted yet, the binary file only holds stacks made meanwhile
+        self._pending_path: str = file_path + '.pending'
+
+    @staticmethod
+    def _dump(data: Dict[str, FrozenCommandStack]) -> bytes:
+        return encode_stacks(data)
+
+    @staticmethod
+    def _parse(content: bytes) -> Dict[str, FrozenCommandStack]:
+        return decode_stacks(content)
+
+    def _read_snapshot(self) -> bytes:
+        with open(self._file_path, 'rb') as handle:
+            return handle.read()
+
+    def load(self):
+        with self._lock:
+            if self._json_path is None or not os.path.isfile(self._json_path) or (
+                    os.path.isfile(self._file_path) and not os.path.isfile(self._pending_path)):
+                super().load()
+                return
+            try:
+                with open(self._json_path, 'r', encoding='utf8') as handle:
+                    json_stacks = CommandStackFileStorage._parse(handle.read())
+            except Exception as e:
+                self._log_callback(f'Fail to convert {self._json_path}, it is tried again on the next load: {e}')
+                json_stacks = None
+                # stacks made until then are saved as usual, and merged with the json file once it converts
+                write_atomic(self._pending_path, b'', self._fsync)
+            super().load()
+            # the json file holds the stacks of the user, no default stacks are made over them
+            self._first_load = False
+            if json_stacks is None:
+                return
+            # the stacks of the user win over the ones made while the conversion was pending
+            stacks = dict(json_stacks)
+            for name, stack in self._stacks.items():
+                stacks.setdefault(name, stack)
+            self._write_data(stacks)
+            if os.path.isfile(self._pending_path):
+                os.remove(self._pending_path)
+            self._publish(stacks)
+            self._reset_index()
+            self._timed_stacks.clear()
+            for name, stack in stacks.items():
+                self._update_timed(name, stack.interval)
+            self._log_callback(f'Converted {self._json_path} to {self._file_path}')
@@ -1,57 +1,238 @@
+import hashlib
 import json
 import os
-from threading import RLock
-from typing import List, Dict, Callable
+import time
+from threading import RLock, Condition, Thread, current_thread
+from typing import List, Dict, Callable, Optional, Any, Tuple, Union
 
 from mcdreforged.api.all import *
 
-from auto_command.storage.storage import CommandStackStorage, CommandStack
+from auto_command.storage.storage import CommandStackStorage, CommandStack, FrozenCommandStack
+from auto_command.storage.snapshot_writer import SnapshotWriter, write_atomic
+from auto_command.storage.search_index import SearchIndex, scan
 from auto_command.exceptions import ACUnknownStackException, ACStackExistsException
 from auto_command.tools.ac_time import ACTime
 
 
 class CommandStackFileStorage(CommandStackStorage):
 
-    def __init__(self, file_path: str, log_callback: Callable[[str], None]):
+    def __init__(
+            self, file_path: str, log_callback: Callable[[str], None],
+            flush_interval: float = 0, flush_max_mutations: int = 0,
+            fsync: bool = True, background_save: bool = False
+    ):
         self._log_callback: Callable[[str], None] = log_callback
         self._file_path: str = file_path
-        self._stacks: Dict[str, CommandStack] = {}
+        self._stacks: Dict[str, FrozenCommandStack] = {}
+        # built on a thread after the first search, which is scanned for meanwhile
+        self._search_index: Optional[SearchIndex] = None
+        self._index_builder: Optional[Thread] = None
+        self._timed_stacks: Dict[str, None] = {}  # insertion ordered set of stacks with a non-zero interval
         self._first_load: bool = False
-        self.__lock = RLock()
+        self._lock = RLock()
+        self._fsync: bool = fsync
+        self._writer: Optional[SnapshotWriter] = SnapshotWriter(self._write_data, log_callback) if background_save else None
+
+        # what the file on disk is known to contain, for detecting external edits
+        self._snapshot_digest: str = ''
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+
+        # write-behind, disabled when flush_interval is 0
+        self._flush_interval: float = flush_interval
+        self._flush_max_mutations: int = flush_max_mutations
+        self._dirty: int = 0
+        self._dirty_since: float = 0
+        self._flush_cond = Condition(self._lock)
+        self._flusher: Optional[Thread] = None
+        self._closed: bool = False
+
+    def _snapshot(self) -> Any:
+        return self._stacks
+
+    @staticmethod
+    def _dump(data: Any) -> str:
+        return json.dumps({name: stack.serialize() for name, stack in data.items()}, indent=4, ensure_ascii=False)
+
+    @staticmethod
+    def _parse(content: Any) -> Dict[str, FrozenCommandStack]:
+        stacks = deserialize(json.loads(content), Dict[str, CommandStack])
+        return {name: FrozenCommandStack.of(stack) for name, stack in stacks.items()}
+
+    @staticmethod
+    def _digest(content: Union[str, bytes]) -> str:
+        return hashlib.sha1(content.encode('utf8') if isinstance(content, str) else content).hexdigest()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_snapshot(self) -> str:
+        with open(self._file_path, 'r', encoding='utf8') as handle:
+            return handle.read()
+
+    def _read(self) -> Union[str, bytes]:
+        stat = self._stat()
+        content = self._read_snapshot()
+        self._snapshot_digest = self._digest(content)
+        self._snapshot_stat = stat
+        return content
+
+    def _write_snapshot(self, content: Union[str, bytes]):
+        self._snapshot_digest = self._digest(content)
+        write_atomic(self._file_path, content, self._fsync)
+        self._snapshot_stat = self._stat()
+
+    def _write_data(self, data: Any):
+        self._write_snapshot(self._dump(data))
 
     def _save(self):
-        with open(self._file_path, 'w', encoding='utf8') as file:
-            json.dump(serialize(self._stacks), file, indent=4, ensure_ascii=False)
+        # the published stack map is immutable, so encoding and disk io can happen on the writer thread
+        data = self._snapshot()
+        if self._writer is None:
+            self._write_data(data)
+        else:
+            self._writer.submit(data)
+
+    def _commit(self, op: str, *args):
+        """
+        Called after every mutation, op is the name of the mutating method and args are its arguments
+        """
+        if self._flush_interval <= 0:
+            self._save()
+            return
+        if self._dirty == 0:
+            self._dirty_since = time.monotonic()
+        self._dirty += 1
+        if self._flusher is None:
+            self._flusher = Thread(target=self._flusher_main, name='AutoCommand-StorageFlusher', daemon=True)
+            self._flusher.start()
+        if self._dirty == 1 or self._dirty >= self._flush_max_mutations > 0:
+            self._flush_cond.notify()
+
+    def _flusher_main(self):
+        with self._lock:
+            while not self._closed:
+                if self._dirty == 0:
+                    self._flush_cond.wait()
+                    continue
+                remaining = self._dirty_since + self._flush_interval - time.monotonic()
+                if remaining > 0 and not (self._dirty >= self._flush_max_mutations > 0):
+                    self._flush_cond.wait(remaining)
+                    continue
+                try:
+                    self._save()
+                    self._dirty = 0
+                except Exception as e:
+                    self._log_callback(f'Fail to flush {self._file_path}: {e}')
+                    self._dirty_since = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty > 0:
+                self._save()
+                self._dirty = 0
+        if self._writer is not None:
+            self._writer.wait()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._flush_cond.notify()
+        if self._writer is not None:
+            self._writer.close()
+
+    def check_external_change(self) -> List[str]:
+        stat = self._stat()
+        if stat is None or stat == self._snapshot_stat:
+            return []
+        with self._lock:
+            if self._dirty > 0 or (self._writer is not None and self._writer.busy):
+                # the pending save is going to overwrite the file anyway
+                return []
+            digest = self._snapshot_digest
+            content = self._read()
+            if self._snapshot_digest == digest:
+                return []
+            try:
+                stacks = self._parse(content)
+            except Exception as e:
+                self._log_callback(f'Fail to reload {self._file_path}: {e}')
+                # the next load would start over from an empty store, so the stacks in memory are written back
+                self._backup_broken_file()
+                self._save()
+                return []
+            return self._apply_external(stacks)
+
+    def _apply_external(self, stacks: Dict[str, FrozenCommandStack]) -> List[str]:
+        """
+        Publishes stacks read from disk, only the stacks that differ from memory are re-indexed
+
+        :return: Names of the stacks that were added, removed or changed
+        """
+        old_stacks = self._stacks
+        changed = [name for name in old_stacks if name not in stacks]
+        for name, stack in stacks.items():
+            old_stack = old_stacks.get(name)
+            if old_stack is None or old_stack.serialize() != stack.serialize():
+                changed.append(name)
+        self._publish(stacks)
+        for name in changed:
+            self._unindex(name)
+            self._timed_stacks.pop(name, None)
+            if name in stacks:
+                self._index(name, stacks[name].desc)
+                self._update_timed(name, stacks[name].interval)
+        return changed
+
+    def _backup_broken_file(self):
+        backup_path = '{}.{}.broken'.format(self._file_path, time.strftime('%Y%m%d%H%M%S'))
+        try:
+            os.replace(self._file_path, backup_path)
+        except OSError as e:
+            self._log_callback(f'Fail to back up {self._file_path}: {e}')
+        else:
+            self._log_callback(f'Moved unreadable {self._file_path} to {backup_path}')
 
     def load(self):
-        with self.__lock:
+        with self._lock:
             folder = os.path.dirname(self._file_path)
             if not os.path.isdir(folder):
                 os.makedirs(folder)
-            self._stacks.clear()
+            self._publish({})
+            self._dirty = 0
             needs_overwrite = False
             if not os.path.isfile(self._file_path):
                 needs_overwrite = True
             else:
-                with open(self._file_path, 'r', encoding='utf8') as handle:
-                    data = None
-                    try:
-                        data = json.load(handle)
-                        stacks = deserialize(data, Dict[str, CommandStack])
-                    except Exception as e:
-                        self._log_callback(f'Fail to load {self._file_path}: {e}')
-                        self._log_callback(f'Unknown data: {data}')
-                        needs_overwrite = True
-                    else:
-                        self._stacks = stacks
+                try:
+                    stacks = self._parse(self._read())
+                except Exception as e:
+                    self._log_callback(f'Fail to load {self._file_path}: {e}')
+                    self._backup_broken_file()
+                    needs_overwrite = True
+                else:
+                    self._publish(stacks)
+            self._reset_index()
+            self._timed_stacks.clear()
+            for name, stack in self._stacks.items():
+                self._update_timed(name, stack.interval)
             if needs_overwrite:
                 self._save()
             self._first_load = needs_overwrite
 
     def first_load(self) -> bool:
-        with self.__lock:
+        with self._lock:
             return self._first_load
 
+    def _update_timed(self, name: str, interval: str):
+        if ACTime.not_zero(interval):
+            self._timed_stacks[name] = None
+        else:
+            self._timed_stacks.pop(name, None)
+
     def _assert_exists(self, name: str):
         if not self.contains(name):
             raise ACUnknownStackException(name)
@@ -60,86 +241,147 @@ class CommandStackFileStorage(CommandStackStorage):
         if self.contains(name):
             raise ACStackExistsException(name)
 
-    def get(self, name: str) -> CommandStack:
-        with self.__lock:
-            self._assert_exists(name)
-            return self._stacks.get(name)
+    def get(self, name: str) -> FrozenCommandStack:
+        stack = self._stacks.get(name)
+        if stack is None:
+            raise ACUnknownStackException(name)
+        return stack
 
     def contains(self, name: str) -> bool:
-        with self.__lock:
-            return name in self._stacks
+        return name in self._stacks
 
     def stack_names(self) -> List[str]:
-        with self.__lock:
-            return list(self._stacks.keys())
+        return list(self._stacks.keys())
 
     def timed_stack_names(self) -> List[str]:
-        with self.__lock:
-            timed_stack_names = []
-            for name in self._stacks:
-                if ACTime.not_zero(self._stacks[name].interval):
-                    timed_stack_names.append(name)
-            return timed_stack_names
+        with self._lock:
+            return list(self._timed_stacks)
 
     def search_stack(self, keyword: str) -> List[str]:
-        with self.__lock:
-            matched_names = []
-            for name in self._stacks:
-                if name.find(keyword) != -1 or (self._stacks[name].desc is not None and self._stacks[name].desc.find(keyword) != -1):
-                    matched_names.append(name)
-            return matched_names
+        with self._lock:
+            if self._search_index is not None:
+                return self._search_index.search(keyword)
+            if self._index_builder is None:
+                self._index_builder = Thread(target=self._build_index, name='AutoCommand-SearchIndexBuilder', daemon=True)
+                self._index_builder.start()
+            stacks = self._stacks
+        return scan(((name, stack.desc) for name, stack in stacks.items()), keyword)
+
+    def _build_index(self):
+        # the published stack map is immutable, so the index is built without the lock
+        stacks = self._stacks
+        index = SearchIndex()
+        for name, stack in stacks.items():
+            index.add(name, stack.desc)
+        with self._lock:
+            if self._index_builder is not current_thread():
+                return  # reloaded meanwhile
+            # catch up with the mutations made during the build, every mutation publishes new stack objects
+            current = self._stacks
+            for name in stacks:
+                if name not in current:
+                    index.remove(name)
+            for name, stack in current.items():
+                if stacks.get(name) is not stack:
+                    index.add(name, stack.desc)
+            self._search_index = index
+            self._index_builder = None
+
+    def _reset_index(self):
+        self._search_index = None
+        self._index_builder = None
+
+    def _index(self, name: str, desc: Optional[str]):
+        if self._search_index is not None:
+            self._search_index.add(name, desc)
+
+    def _unindex(self, name: str):
+        if self._search_index is not None:
+            self._search_index.remove(name)
+
+    def _publish(self, stacks: Dict[str, FrozenCommandStack]):
+        # published dicts are never mutated, so readers can use self._stacks without the lock
+        self._stacks = stacks
+
+    def _replace(self, name: str, stack: FrozenCommandStack):
+        stacks = dict(self._stacks)
+        stacks[name] = stack
+        self._publish(stacks)
 
     def add_stack(self, name: str, stack: CommandStack):
-        with self.__lock:
+        with self._lock:
             self._assert_not_exists(name)
-            self._stacks[name] = stack
-            self._save()
+            stack = FrozenCommandStack.of(stack)
+            self._replace(name, stack)
+            self._index(name, stack.desc)
+            self._update_timed(name, stack.interval)
+            self._commit('add_stack', name, stack)
 
-    def pop_stack(self, name: str) -> CommandStack:
-        with self.__lock:
+    def pop_stack(self, name: str) -> FrozenCommandStack:
+        with self._lock:
             self._assert_exists(name)
-            stack = self._stacks.pop(name)
-            self._save()
+            stacks = dict(self._stacks)
+            stack = stacks.pop(name)
+            self._publish(stacks)
+            self._unindex(name)
+            self._timed_stacks.pop(name, None)
+            self._commit('pop_stack', name)
             return stack
 
     def add_command(self, name: str, command: str, line: int):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.command.insert(line, command)
-            self._save()
+            commands = list(stack.command)
+            commands.insert(line, command)
+            self._replace(name, stack.replace(command=commands))
+            self._commit('add_command', name, command, line)
 
     def edit_command(self, name: str, command: str, line: int):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.command[line] = command
-            self._save()
+            commands = list(stack.command)
+            commands[line] = command
+            self._replace(name, stack.replace(command=commands))
+            self._commit('edit_command', name, command, line)
 
     def del_command(self, name: str, line: int):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.command.pop(line)
-            self._save()
+            commands = list(stack.command)
+            commands.pop(line)
+            self._replace(name, stack.replace(command=commands))
+            self._commit('del_command', name, line)
 
     def change_name(self, name: str, new_name: str):
-        with self.__lock:
-            stack = self.pop_stack(name)
-            self.add_stack(new_name, stack)
-            self._save()
+        with self._lock:
+            self._assert_exists(name)
+            self._assert_not_exists(new_name)
+            stacks = dict(self._stacks)
+            stack = stacks.pop(name)
+            stacks[new_name] = stack
+            self._publish(stacks)
+            self._unindex(name)
+            self._index(new_name, stack.desc)
+            self._timed_stacks.pop(name, None)
+            self._update_timed(new_name, stack.interval)
+            self._commit('change_name', name, new_name)
 
     def change_perm(self, name: str, level: int):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.perm = level
-            self._save()
+            self._replace(name, stack.replace(perm=level))
+            self._commit('change_perm', name, level)
 
     def change_interval(self, name: str, time: str):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.interval = time
-            self._save()
+            self._replace(name, stack.replace(interval=time))
+            self._update_timed(name, time)
+            self._commit('change_interval', name, time)
 
     def change_desc(self, name: str, desc: str):
-        with self.__lock:
+        with self._lock:
             stack = self.get(name)
-            stack.desc = desc
-            self._save()
+            self._replace(name, stack.replace(desc=desc))
+            self._index(name, desc)
+            self._commit('change_desc', name, desc)
@@ -0,0 +1,143 @@
+import json
+import os
+from typing import Callable, Dict, Optional, TextIO, List
+
+from mcdreforged.api.all import *
+
+from auto_command.storage.storage import CommandStack, FrozenCommandStack
+from auto_command.storage.storage_file import CommandStackFileStorage
+from auto_command.storage.snapshot_writer import write_atomic
+
+
+class CommandStackJournalStorage(CommandStackFileStorage):
+    """
+    Keeps the json file as a snapshot and appends every mutation to a journal file as one compact json line
+
+    The first line of the journal records the digest of the snapshot it is based on,
+    so a journal left behind by a crash during compaction is never replayed twice
+    """
+
+    _replayable_ops = (
+        'add_stack', 'pop_stack', 'add_command', 'edit_command', 'del_command',
+        'change_name', 'change_perm', 'change_interval', 'change_desc'
+    )
+
+    def __init__(
+            self, file_path: str, journal_path: str, compact_threshold: int, log_callback: Callable[[str], None],
+            fsync_snapshot: bool = True, fsync_journal: bool = False
+    ):
+        # compaction resets the journal right after the snapshot, so snapshots are always written synchronously
+        super().__init__(file_path, log_callback, fsync=fsync_snapshot)
+        self._fsync_journal: bool = fsync_journal
+        self._journal_path: str = journal_path
+        self._compact_threshold: int = compact_threshold
+        self._journal: Optional[TextIO] = None
+        self._journal_records: int = 0
+        self._replaying: bool = False
+
+    def _write_snapshot(self, content: str):
+        super()._write_snapshot(content)
+        self._reset_journal()
+
+    def check_external_change(self) -> List[str]:
+        with self._lock:
+            if self._journal_records > 0 and self._stat() not in (None, self._snapshot_stat):
+                # the edited file lacks the records, they are compacted over it like a pending save would do
+                self._log_callback(f'Ignored the edit of {self._file_path} as {self._journal_path} has records not compacted into it')
+                self._save()
+                return []
+            return super().check_external_change()
+
+    def _apply_external(self, stacks: Dict[str, FrozenCommandStack]) -> List[str]:
+        changed = super()._apply_external(stacks)
+        # the edited file is the new base, records made on top of the old one no longer apply
+        self._reset_journal()
+        return changed
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def close(self):
+        with self._lock:
+            super().close()
+            self._close_journal()
+
+    def _reset_journal(self):
+        self._close_journal()
+        write_atomic(self._journal_path, json.dumps({'base': self._snapshot_digest}) + '\n', self._fsync)
+        self._journal = open(self._journal_path, 'a', encoding='utf8')
+        self._journal_records = 0
+
+    def _commit(self, op: str, *args):
+        if self._replaying:
+            return
+        record = [op, *args]
+        if op == 'add_stack':
+            record[2] = record[2].serialize()
+        if self._journal is None:
+            self._reset_journal()
+        self._journal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if self._fsync_journal:
+            os.fsync(self._journal.fileno())
+        self._journal_records += 1
+        if self._journal_records >= self._compact_threshold:
+            self._save()
+
+    def _replay(self) -> bool:
+        """
+        Applies the records in the journal on top of the loaded snapshot
+
+        :return: True if the journal is in sync with the snapshot and has nothing to compact
+        """
+        if not os.path.isfile(self._journal_path):
+            return False
+        with open(self._journal_path, 'r', encoding='utf8') as handle:
+            lines = handle.read().split('\n')
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            self._log_callback(f'Broken journal header in {self._journal_path}, ignoring the journal')
+            return False
+        if header.get('base') != self._snapshot_digest:
+            self._log_callback(f'Journal {self._journal_path} does not match the snapshot, ignoring the journal')
+            return False
+
+        replayed = 0
+        for line in lines[1:]:
+            if line == '':
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # an interrupted append leaves a partial line at the tail
+                self._log_callback(f'Truncated record in {self._journal_path}, stop replaying')
+                break
+            op, args = record[0], record[1:]
+            if op not in self._replayable_ops:
+                self._log_callback(f'Unknown journal record: {record}')
+                continue
+            if op == 'add_stack':
+                args[1] = deserialize(args[1], CommandStack)
+            self._replaying = True
+            try:
+                getattr(self, op)(*args)
+            except Exception as e:
+                self._log_callback(f'Fail to replay journal record {record}: {e}')
+            finally:
+                self._replaying = False
+            replayed += 1
+        return replayed == 0
+
+    def load(self):
+        with self._lock:
+            self._close_journal()
+            self._snapshot_digest = ''
+            super().load()
+            if self._journal is None and not self._replay():
+                # compact the replayed records into a fresh snapshot
+                self._save()
+            elif self._journal is None:
+                self._journal = open(self._journal_path, 'a', encoding='utf8')
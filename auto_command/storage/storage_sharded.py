@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from mcdreforged.api.all import *
+
+from auto_command.storage.storage import CommandStack, FrozenCommandStack
+from auto_command.storage.storage_file import CommandStackFileStorage
+from auto_command.storage.snapshot_writer import write_atomic
+
+
+class CommandStackShardedStorage(CommandStackFileStorage):
+    """
+    Stores every stack in its own file inside a folder, with a manifest listing the stacks in order
+
+    The manifest is the commit point: a stack belongs to the storage once the manifest references its shard,
+    so renaming writes the new shard, then the manifest, and only then removes the old shard
+    """
+
+    def __init__(
+            self, folder: str, json_path: Optional[str], log_callback: Callable[[str], None],
+            load_workers: int = 4, fsync: bool = True
+    ):
+        super().__init__(os.path.join(folder, 'manifest.json'), log_callback, fsync=fsync)
+        self._folder: str = folder
+        self._json_path: Optional[str] = json_path
+        # exists while the json file is not split yet, the shards only hold stacks made meanwhile
+        self._pending_path: str = self._file_path + '.pending'
+        self._load_workers: int = load_workers
+        self._manifest: Dict[str, str] = {}  # stack name -> shard file name, in stack order
+        self._shard_stats: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    @staticmethod
+    def _shard_file_name(name: str) -> str:
+        readable = re.sub(r'[^\w.-]', '_', name)[:32]
+        return '{}-{}.json'.format(readable, hashlib.sha1(name.encode('utf8')).hexdigest()[:8])
+
+    def _shard_path(self, file_name: str) -> str:
+        return os.path.join(self._folder, file_name)
+
+    def _shard_stat(self, file_name: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self._shard_path(file_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_shard(self, file_name: str) -> Tuple[FrozenCommandStack, Optional[Tuple[int, int]]]:
+        stat = self._shard_stat(file_name)
+        with open(self._shard_path(file_name), 'r', encoding='utf8') as handle:
+            stack = deserialize(json.load(handle), CommandStack)
+        return FrozenCommandStack.of(stack), stat
+
+    def _write_shard(self, name: str):
+        file_name = self._manifest[name]
+        content = json.dumps(self._stacks[name].serialize(), indent=4, ensure_ascii=False)
+        write_atomic(self._shard_path(file_name), content, self._fsync)
+        self._shard_stats[name] = self._shard_stat(file_name)
+
+    def _remove_shard(self, file_name: str):
+        try:
+            os.remove(self._shard_path(file_name))
+        except OSError as e:
+            self._log_callback(f'Fail to remove shard {file_name}: {e}')
+
+    def _write_manifest(self):
+        manifest = {'stacks': [[name, file_name] for name, file_name in self._manifest.items()]}
+        self._write_snapshot(json.dumps(manifest, indent=4, ensure_ascii=False))
+
+    def _load_shard(self, name: str, file_name: str) -> Optional[Tuple[FrozenCommandStack, Optional[Tuple[int, int]]]]:
+        """
+        A missing or unreadable shard only loses its own stack, an unreadable one is moved aside
+        """
+        try:
+            return self._read_shard(file_name)
+        except Exception as e:
+            self._log_callback(f'Fail to load shard {file_name} of command stack {name}, skipped: {e}')
+        path = self._shard_path(file_name)
+        if os.path.isfile(path):
+            backup_path = '{}.{}.broken'.format(path, time.strftime('%Y%m%d%H%M%S'))
+            try:
+                os.replace(path, backup_path)
+            except OSError as e:
+                self._log_callback(f'Fail to back up {path}: {e}')
+            else:
+                self._log_callback(f'Moved unreadable {path} to {backup_path}')
+        return None
+
+    def _parse(self, content: str) -> Dict[str, FrozenCommandStack]:
+        entries: List[List[str]] = json.loads(content)['stacks']
+        with ThreadPoolExecutor(max_workers=max(1, self._load_workers), thread_name_prefix='AutoCommand-ShardLoader') as executor:
+            results = list(executor.map(lambda entry: self._load_shard(entry[0], entry[1]), entries))
+        self._manifest = {}
+        self._shard_stats = {}
+        stacks = {}
+        for (name, file_name), result in zip(entries, results):
+            if result is None:
+                continue
+            stacks[name], self._shard_stats[name] = result
+            self._manifest[name] = file_name
+        return stacks
+
+    def _save(self):
+        self._manifest = {name: self._shard_file_name(name) for name in self._stacks}
+        for name in self._stacks:
+            self._write_shard(name)
+        self._write_manifest()
+
+    def _commit(self, op: str, *args):
+        name = args[0]
+        if op == 'add_stack':
+            self._manifest[name] = self._shard_file_name(name)
+            self._write_shard(name)
+            self._write_manifest()
+        elif op == 'pop_stack':
+            file_name = self._manifest.pop(name)
+            self._shard_stats.pop(name, None)
+            self._write_manifest()
+            self._remove_shard(file_name)
+        elif op == 'change_name':
+            new_name = args[1]
+            file_name = self._manifest.pop(name)
+            self._shard_stats.pop(name, None)
+            self._manifest[new_name] = self._shard_file_name(new_name)
+            self._write_shard(new_name)
+            self._write_manifest()
+            self._remove_shard(file_name)
+        else:
+            self._write_shard(name)
+
+    def load(self):
+        with self._lock:
+            if not os.path.isdir(self._folder):
+                os.makedirs(self._folder)
+            if self._json_path is None or not os.path.isfile(self._json_path) or (
+                    os.path.isfile(self._file_path) and not os.path.isfile(self._pending_path)):
+                super().load()
+                return
+            try:
+                with open(self._json_path, 'r', encoding='utf8') as handle:
+                    json_stacks = CommandStackFileStorage._parse(handle.read())
+            except Exception as e:
+                self._log_callback(f'Fail to split {self._json_path} into shards, it is tried again on the next load: {e}')
+                json_stacks = None
+                # stacks made until then are saved as usual, and merged with the json file once it splits
+                write_atomic(self._pending_path, '', self._fsync)
+            super().load()
+            # the json file holds the stacks of the user, no default stacks are made over them
+            self._first_load = False
+            if json_stacks is None:
+                return
+            # the stacks of the user win over the ones made while the split was pending
+            stacks = dict(json_stacks)
+            for name, stack in self._stacks.items():
+                stacks.setdefault(name, stack)
+            self._publish(stacks)
+            self._save()
+            if os.path.isfile(self._pending_path):
+                os.remove(self._pending_path)
+            self._reset_index()
+            self._timed_stacks.clear()
+            for name, stack in stacks.items():
+                self._update_timed(name, stack.interval)
+            self._log_callback(f'Split {self._json_path} into {len(stacks)} shards')
+
+    def check_external_change(self) -> List[str]:
+        changed = super().check_external_change()
+        if changed:
+            return changed
+        with self._lock:
+            stacks = None
+            for name, file_name in self._manifest.items():
+                if self._shard_stat(file_name) == self._shard_stats.get(name):
+                    continue
+                try:
+                    stack, stat = self._read_shard(file_name)
+                except Exception as e:
+                    self._log_callback(f'Fail to reload shard {file_name}: {e}')
+                    continue
+                self._shard_stats[name] = stat
+                if stack.serialize() != self._stacks[name].serialize():
+                    if stacks is None:
+                        stacks = dict(self._stacks)
+                    stacks[name] = stack
+            if stacks is None:
+                return []
+            return self._apply_external(stacks)
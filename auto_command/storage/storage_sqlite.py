@@ -0,0 +1,287 @@
+import json
+import os
+import sqlite3
+from threading import RLock
+from typing import List, Dict, Callable, Optional
+
+from mcdreforged.api.all import *
+
+from auto_command.storage.storage import CommandStackStorage, CommandStack, FrozenCommandStack
+from auto_command.exceptions import ACUnknownStackException, ACStackExistsException
+from auto_command.tools.ac_time import ACTime
+
+
+class CommandStackSqliteStorage(CommandStackStorage):
+    """
+    Stores stacks and their command lines in normalized sqlite tables
+
+    Keyword search uses a fts5 trigram table when sqlite supports it, and falls back to a scan otherwise
+    """
+
+    _schema = '''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS stacks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            desc TEXT,
+            perm INTEGER NOT NULL,
+            interval TEXT NOT NULL,
+            timed INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_stacks_interval ON stacks (interval);
+        CREATE INDEX IF NOT EXISTS idx_stacks_timed ON stacks (timed);
+        CREATE INDEX IF NOT EXISTS idx_stacks_desc ON stacks (desc);
+        CREATE TABLE IF NOT EXISTS commands (
+            stack_id INTEGER NOT NULL REFERENCES stacks (id) ON DELETE CASCADE,
+            line INTEGER NOT NULL,
+            command TEXT NOT NULL,
+            PRIMARY KEY (stack_id, line)
+        ) WITHOUT ROWID;
+    '''
+
+    def __init__(self, db_path: str, json_path: Optional[str], log_callback: Callable[[str], None], synchronous: str = 'NORMAL'):
+        self._log_callback: Callable[[str], None] = log_callback
+        self._synchronous: str = synchronous
+        self._db_path: str = db_path
+        self._json_path: Optional[str] = json_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts: bool = False
+        self._first_load: bool = False
+        self.__lock = RLock()
+
+    def _connect(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA foreign_keys = ON')
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute(f'PRAGMA synchronous = {self._synchronous}')
+        self._conn.executescript(self._schema)
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS stack_search USING fts5(name, desc, tokenize = 'trigram case_sensitive 1')")
+        except sqlite3.OperationalError:
+            self._fts = False
+        else:
+            self._fts = True
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key: str, value: str):
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def load(self):
+        with self.__lock:
+            folder = os.path.dirname(self._db_path)
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+            is_new = not os.path.isfile(self._db_path)
+            self._connect()
+            self._first_load = False
+            if self._get_meta('migrated') is None:
+                has_json = self._json_path is not None and os.path.isfile(self._json_path)
+                if not has_json or self.migrate_from_json(self._json_path):
+                    with self._transaction():
+                        self._set_meta('migrated', '1')
+                # a json file that fails to import is tried again on the next load, so the store isn't fresh meanwhile
+                self._first_load = is_new and not has_json
+
+    def close(self):
+        with self.__lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def migrate_from_json(self, json_path: str) -> bool:
+        """
+        Imports every stack in a json storage file, a stack of the same name is replaced by the imported one
+
+        Stacks that exist before the import were made while it was pending, like the default ones,
+        so the stacks of the user win over them
+
+        :return: True if the file has been imported
+        """
+        with self.__lock:
+            try:
+                with open(json_path, 'r', encoding='utf8') as handle:
+                    stacks = deserialize(json.load(handle), Dict[str, CommandStack])
+            except Exception as e:
+                self._log_callback(f'Fail to migrate {json_path}: {e}')
+                return False
+            with self._transaction():
+                for name, stack in stacks.items():
+                    if self.contains(name):
+                        self._delete_stack(self._stack_id(name))
+                    self._insert_stack(name, stack)
+            self._log_callback(f'Migrated {len(stacks)} command stacks from {json_path}')
+            return True
+
+    def first_load(self) -> bool:
+        with self.__lock:
+            return self._first_load
+
+    def _stack_id(self, name: str) -> int:
+        row = self._conn.execute('SELECT id FROM stacks WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            raise ACUnknownStackException(name)
+        return row[0]
+
+    def _assert_not_exists(self, name: str):
+        if self.contains(name):
+            raise ACStackExistsException(name)
+
+    def _insert_stack(self, name: str, stack: CommandStack):
+        cursor = self._conn.execute(
+            'INSERT INTO stacks (name, desc, perm, interval, timed) VALUES (?, ?, ?, ?, ?)',
+            (name, stack.desc, stack.perm, stack.interval, int(ACTime.not_zero(stack.interval)))
+        )
+        stack_id = cursor.lastrowid
+        self._conn.executemany(
+            'INSERT INTO commands (stack_id, line, command) VALUES (?, ?, ?)',
+            [(stack_id, line, command) for line, command in enumerate(stack.command)]
+        )
+        if self._fts:
+            self._conn.execute('INSERT INTO stack_search (rowid, name, desc) VALUES (?, ?, ?)', (stack_id, name, stack.desc))
+
+    def _delete_stack(self, stack_id: int):
+        self._conn.execute('DELETE FROM stacks WHERE id = ?', (stack_id,))
+        if self._fts:
+            self._conn.execute('DELETE FROM stack_search WHERE rowid = ?', (stack_id,))
+
+    def _update_search(self, stack_id: int):
+        if self._fts:
+            self._conn.execute('DELETE FROM stack_search WHERE rowid = ?', (stack_id,))
+            self._conn.execute('INSERT INTO stack_search (rowid, name, desc) SELECT id, name, desc FROM stacks WHERE id = ?', (stack_id,))
+
+    def get(self, name: str) -> FrozenCommandStack:
+        with self.__lock:
+            row = self._conn.execute('SELECT id, desc, perm, interval FROM stacks WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                raise ACUnknownStackException(name)
+            commands = self._conn.execute('SELECT command FROM commands WHERE stack_id = ? ORDER BY line', (row[0],)).fetchall()
+            return FrozenCommandStack(desc=row[1], perm=row[2], interval=row[3], command=[c[0] for c in commands])
+
+    def contains(self, name: str) -> bool:
+        with self.__lock:
+            return self._conn.execute('SELECT 1 FROM stacks WHERE name = ?', (name,)).fetchone() is not None
+
+    def stack_names(self) -> List[str]:
+        with self.__lock:
+            return [row[0] for row in self._conn.execute('SELECT name FROM stacks ORDER BY id')]
+
+    def timed_stack_names(self) -> List[str]:
+        with self.__lock:
+            return [row[0] for row in self._conn.execute('SELECT name FROM stacks WHERE timed = 1 ORDER BY id')]
+
+    def search_stack(self, keyword: str) -> List[str]:
+        with self.__lock:
+            if self._fts and len(keyword) >= 3:
+                rows = self._conn.execute(
+                    'SELECT s.name FROM stack_search f JOIN stacks s ON s.id = f.rowid WHERE stack_search MATCH ? ORDER BY s.id',
+                    ('"{}"'.format(keyword.replace('"', '""')),)
+                )
+            else:
+                rows = self._conn.execute(
+                    'SELECT name FROM stacks WHERE instr(name, ?) > 0 OR instr(desc, ?) > 0 ORDER BY id',
+                    (keyword, keyword)
+                )
+            return [row[0] for row in rows]
+
+    def add_stack(self, name: str, stack: CommandStack):
+        with self.__lock:
+            self._assert_not_exists(name)
+            with self._transaction():
+                self._insert_stack(name, stack)
+
+    def pop_stack(self, name: str) -> FrozenCommandStack:
+        with self.__lock:
+            stack = self.get(name)
+            with self._transaction():
+                self._delete_stack(self._stack_id(name))
+            return stack
+
+    def _line_count(self, stack_id: int) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM commands WHERE stack_id = ?', (stack_id,)).fetchone()[0]
+
+    def add_command(self, name: str, command: str, line: int):
+        with self.__lock:
+            with self._transaction():
+                stack_id = self._stack_id(name)
+                line = min(line, self._line_count(stack_id))
+                # shift through negative numbers so that the primary key never collides
+                self._conn.execute('UPDATE commands SET line = -line - 2 WHERE stack_id = ? AND line >= ?', (stack_id, line))
+                self._conn.execute('UPDATE commands SET line = -line - 1 WHERE stack_id = ? AND line < 0', (stack_id,))
+                self._conn.execute('INSERT INTO commands (stack_id, line, command) VALUES (?, ?, ?)', (stack_id, line, command))
+
+    def edit_command(self, name: str, command: str, line: int):
+        with self.__lock:
+            with self._transaction():
+                stack_id = self._stack_id(name)
+                cursor = self._conn.execute('UPDATE commands SET command = ? WHERE stack_id = ? AND line = ?', (command, stack_id, line))
+                if cursor.rowcount == 0:
+                    raise IndexError('list assignment index out of range')
+
+    def del_command(self, name: str, line: int):
+        with self.__lock:
+            with self._transaction():
+                stack_id = self._stack_id(name)
+                cursor = self._conn.execute('DELETE FROM commands WHERE stack_id = ? AND line = ?', (stack_id, line))
+                if cursor.rowcount == 0:
+                    raise IndexError('pop index out of range')
+                self._conn.execute('UPDATE commands SET line = -line WHERE stack_id = ? AND line > ?', (stack_id, line))
+                self._conn.execute('UPDATE commands SET line = -line - 1 WHERE stack_id = ? AND line < 0', (stack_id,))
+
+    def change_name(self, name: str, new_name: str):
+        with self.__lock:
+            self._assert_not_exists(new_name)
+            with self._transaction():
+                stack_id = self._stack_id(name)
+                self._conn.execute('UPDATE stacks SET name = ? WHERE id = ?', (new_name, stack_id))
+                self._update_search(stack_id)
+
+    def change_perm(self, name: str, level: int):
+        with self.__lock:
+            with self._transaction():
+                self._conn.execute('UPDATE stacks SET perm = ? WHERE id = ?', (level, self._stack_id(name)))
+
+    def change_interval(self, name: str, time: str):
+        with self.__lock:
+            with self._transaction():
+                self._conn.execute('UPDATE stacks SET interval = ?, timed = ? WHERE id = ?', (time, int(ACTime.not_zero(time)), self._stack_id(name)))
+
+    def change_desc(self, name: str, desc: str):
+        with self.__lock:
+            with self._transaction():
+                stack_id = self._stack_id(name)
+                self._conn.execute('UPDATE stacks SET desc = ? WHERE id = ?', (desc, stack_id))
+                self._update_search(stack_id)
+
+
+class _Transaction:
+    """
+    Reentrant BEGIN / COMMIT block for a connection in autocommit mode
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        self._owner = False
+
+    def __enter__(self):
+        if not self._conn.in_transaction:
+            self._conn.execute('BEGIN')
+            self._owner = True
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._owner:
+            if exc_type is None:
+                self._conn.execute('COMMIT')
+            else:
+                self._conn.execute('ROLLBACK')
+        return False
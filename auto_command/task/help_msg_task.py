@@ -44,5 +44,8 @@ class HelpMessageTask:
         else:
             self._svc.print(source, self._svc.tr('fail_msg.time_format_mismatch', time))
 
+    def print_parallel_help(self, source: CommandSource):
+        self._svc.print(source, self._svc.tr('help_message.parallel'))
+
     def print_perm_help(self, source: CommandSource, regex: str, white: bool = True):
         self._svc.print(source, self._svc.tr('help_message.perm.header', regex, self._svc.tr(f'help_message.perm.{"white" if white else "black"}')))
@@ -0,0 +1,43 @@
+from threading import Event, Thread
+from typing import Optional
+
+from mcdreforged.api.all import *
+
+from auto_command.context import Context
+from auto_command.storage.storage import CommandStackStorage
+from auto_command.task.interval_send_task import IntervalSendTask
+
+
+class HotReloadTask:
+    def __init__(self, ctx: Context, storage: CommandStackStorage, interval_send_task: IntervalSendTask):
+        self._svc = ctx.svc
+        self._interval = ctx.cfg.storage.hot_reload_interval
+        self._storage = storage
+        self._interval_send_task = interval_send_task
+        self._stop_event = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self):
+        if self._interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = Thread(target=self._thread_main, name='AutoCommand-HotReload', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _thread_main(self):
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.check()
+            except Exception:
+                self._svc.log_exception('Failed to reload command stacks')
+
+    def check(self):
+        changed = self._storage.check_external_change()
+        if not changed:
+            return
+        self._svc.log_info('Reloaded {} changed command stacks: {}'.format(len(changed), ', '.join(changed)))
+        for name in changed:
+            self._interval_send_task.sync_timed_stack(name)
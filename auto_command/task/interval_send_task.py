@@ -1,14 +1,15 @@
-from typing import Callable
+from typing import Callable, Dict, Optional, Union
 from threading import RLock
 
 from mcdreforged.api.all import *
 
 from auto_command.context import Context
 from auto_command.storage.storage import CommandStackStorage
-from auto_command.tools.timer import FlexibleAsyncTimer
-from auto_command.constant import DEFAULT_TIME_INTERVAL_UNIT
-from auto_command.tools.ac_time import ACTime
-from auto_command.exceptions import ACTimeFormatMismatchException, ACZeroTimeIntervalException
+from auto_command.tools.scheduler import Scheduler, ScheduledHandle
+from auto_command.tools.tick_clock import TickWaiter
+from auto_command.constant import DEFAULT_TIME_INTERVAL_UNIT, COMMAND_TIMEOUT
+from auto_command.tools.ac_time import ACTime, Duration
+from auto_command.exceptions import ACZeroTimeIntervalException
 
 
 class IntervalSendTask:
@@ -17,9 +18,12 @@ class IntervalSendTask:
         self._utils = ctx.utils
         self._source = self._svc.get_plugin_command_source()
         self._time = ctx.time
+        self._tick_clock = ctx.tick_clock
         self._storage = storage
         self._send_command_stack = send_command_stack
-        self._timers: [str, FlexibleAsyncTimer] = {}
+        self._scheduler = Scheduler(self._svc.log_warning, 'AutoCommand-IntervalScheduler')
+        self._timers: Dict[str, Union[ScheduledHandle, TickWaiter]] = {}
+        self._intervals: Dict[str, str] = {}
         self.__lock = RLock()
 
     def reset_timed_stacks(self):
@@ -29,33 +33,82 @@ class IntervalSendTask:
 
     def stop_timed_stacks(self):
         with self.__lock:
-            for name in self._storage.timed_stack_names():
+            for name in list(self._timers):
+                self.stop_timed_stack(name)
+
+    def sync_timed_stack(self, name: str):
+        """
+        Starts, resets or stops the timer of a stack to match its interval in storage,
+        a timer that is already running with the same interval is left untouched
+        """
+        with self.__lock:
+            if not self._storage.contains(name):
+                self.stop_timed_stack(name)
+                return
+            interval = self._storage.get(name).interval
+            if not ACTime.not_zero(interval):
                 self.stop_timed_stack(name)
+            elif self._intervals.get(name) != interval:
+                self.start_timed_stack(name)
+
+    def _schedule(self, name: str, interval: Duration):
+        handle: Optional[Union[ScheduledHandle, TickWaiter]] = None
+
+        def fire(e: Optional[Exception] = None):
+            with self.__lock:
+                # a timer reset or stopped meanwhile replaced or removed its handle
+                if self._timers.get(name) is not handle:
+                    return
+                if e is not None:
+                    self._tick_timer_failed(name, interval, e)
+                    return
+                self._schedule(name, interval)
+            self._send_command_stack(self._svc.get_plugin_command_source(), name)
+
+        if interval.is_tick:
+            # intervals in ticks follow the gametime, so they stay in step with a lagging server
+            handle = self._tick_clock.call_after_ticks(int(interval.amount), fire)
+        else:
+            handle = self._scheduler.schedule(interval.amount, fire)
+        self._timers[name] = handle
+
+    def _tick_timer_failed(self, name: str, interval: Duration, e: Exception):
+        """
+        The gametime could not be got. A stopped server restarts every timer once it starts again,
+        on a lagging one the timer backs off before it polls the gametime again
+        """
+        if not self._svc.is_server_running():
+            self._timers.pop(name)
+            self._intervals.pop(name, None)
+            self._svc.log_warning('Stopped timer of {} until the server starts: {}'.format(name, self._utils.get_exception_msg(e)))
+            return
+
+        handle: Optional[ScheduledHandle] = None
+
+        def retry():
+            with self.__lock:
+                if self._timers.get(name) is handle:
+                    self._schedule(name, interval)
+
+        self._svc.log_warning('Skipped timed send of {}: {}'.format(name, self._utils.get_exception_msg(e)))
+        handle = self._scheduler.schedule(max(interval.seconds, COMMAND_TIMEOUT), retry)
+        self._timers[name] = handle
 
-    @new_thread
     def start_timed_stack(self, name):
         try:
             with self.__lock:
                 stack = self._storage.get(name)
 
-                timer: FlexibleAsyncTimer
+                interval = ACTime.parse(stack.interval, DEFAULT_TIME_INTERVAL_UNIT)
+                if interval.is_zero:
+                    raise ACZeroTimeIntervalException
+
                 reset: bool = False
                 if name in self._timers:
-                    timer = self._timers[name]
+                    self._timers.pop(name).cancel()
                     reset = True
-                else:
-                    timer = FlexibleAsyncTimer(lambda: self._send_command_stack(self._svc.get_plugin_command_source(), name))
-                    self._timers[name] = timer
-
-                if not ACTime.is_time_format(stack.interval):
-                    raise ACTimeFormatMismatchException(stack.interval)
-                if ACTime.is_zero(stack.interval):
-                    raise ACZeroTimeIntervalException
-
-                async def _inline():
-                    await self._time.sleep(stack.interval, DEFAULT_TIME_INTERVAL_UNIT)
-
-                timer.start(_inline)
+                self._schedule(name, interval)
+                self._intervals[name] = stack.interval
 
         except Exception as e:
             self._svc.print(self._source, self._svc.tr('start_timer.fail', name, self._utils.get_exception_msg(e)), tell=False)
@@ -74,9 +127,8 @@ class IntervalSendTask:
                 stop: bool = False
                 if name in self._timers:
                     stop = True
-                    timer: FlexibleAsyncTimer = self._timers[name]
-                    timer.stop()
-                    self._timers.pop(name)
+                    self._timers.pop(name).cancel()
+                    self._intervals.pop(name, None)
 
         except Exception as e:
             self._svc.print(self._source, self._svc.tr('stop_timer.fail', name, self._utils.get_exception_msg(e)))
@@ -8,6 +8,7 @@ from auto_command.context import Context
 from auto_command.storage.storage import CommandStackStorage
 from auto_command.task.edit_cmd_in_stack_task import EditCommandInStackTask
 from auto_command.task.cmd_perm_task import CommandPermTask
+from auto_command.tools.ac_time import ACTime
 from auto_command.exceptions import ACPermDeniedException
 
 
@@ -65,7 +66,7 @@ class RecordCommandStackTask:
                 if re.match('/player (.*) spawn here', command):
                     command = self._utils.interpret_player_spawn(source, command)
                     loop = asyncio.new_event_loop()
-                    loop.run_until_complete(self._time.sleep(self._cfg.player_spawn_here_delay, 's'))
+                    loop.run_until_complete(self._time.sleep(ACTime.parse(self._cfg.player_spawn_here_delay, 's')))
                     loop.close()
                 elif re.fullmatch(r'/player (.*) spawn', command):
                     exec_command = self._utils.interpret_player_spawn(source, command)
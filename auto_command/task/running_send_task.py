@@ -0,0 +1,48 @@
+from mcdreforged.api.all import *
+
+from auto_command.context import Context
+from auto_command.tools.send_registry import SendRegistry
+from auto_command.exceptions import ACUnknownSendException
+
+
+class RunningSendTask:
+    def __init__(self, ctx: Context, registry: SendRegistry):
+        self._cfg = ctx.cfg
+        self._svc = ctx.svc
+        self._utils = ctx.utils
+        self._registry = registry
+
+    def list_running_sends(self, source: CommandSource):
+        running_sends = self._registry.running_sends()
+        for running in running_sends:
+            line = RTextList()
+            line.append(
+                RText('[x]', RColor.red).
+                h(self._svc.tr('running_send.cancel_hover')).
+                c(RAction.run_command, f'{self._cfg.prefix} cancel {running.id}')
+            )
+            line.append(f' #{running.id} ')
+            line.append(self._utils.click_info(RText(running.name, RColor.gold)))
+            line.append(' ')
+            line.append(self._svc.tr('running_send.line', running.stack, running.line))
+            line.append(' ')
+            line.append(RText(f'{running.elapsed:.1f}s', RColor.aqua).h(self._svc.tr('running_send.elapsed_hover')))
+            line.append(' ')
+            line.append(RText(running.user, RColor.gray).h(self._svc.tr('running_send.user_hover')))
+            self._svc.print(source, line, prefix=RText('- ', RColor.gray))
+        self._svc.print(source, self._svc.tr('running_send.count', len(running_sends)))
+        metrics = self._svc.command_queue_metrics()
+        self._svc.print(source, self._svc.tr('running_send.command_queue', metrics.depth, metrics.max_depth, metrics.dispatched, round(metrics.average_wait, 2)))
+
+    def cancel_send(self, source: CommandSource, send_id: int):
+        try:
+            running = self._registry.get(send_id)
+            if running is None:
+                raise ACUnknownSendException(send_id)
+            self._svc.req_perm(source, running.perm)
+            running.cancel()
+
+        except Exception as e:
+            self._svc.print(source, self._svc.tr('running_send.cancel_fail', send_id, self._utils.get_exception_msg(e)))
+        else:
+            self._svc.print(source, self._svc.tr('running_send.cancel_success', send_id, running.name))
@@ -1,29 +1,85 @@
-import asyncio
+from typing import List, Optional
 
 from mcdreforged.api.all import *
 
 from auto_command.context import Context
 from auto_command.storage.storage import CommandStackStorage
 from auto_command.tools.sender import CommandStackSender
+from auto_command.tools.send_executor import SendExecutor
+from auto_command.tools.send_registry import SendRegistry
+from auto_command.tools.send_trace import SendTrace, TraceLine, TraceNode
 from auto_command.task.interval_send_task import IntervalSendTask
 from auto_command.tools.ac_time import ACTime
 
 
 class SendCommandStackTask:
-    def __init__(self, ctx: Context, storage: CommandStackStorage, interval_send_task: IntervalSendTask):
+    def __init__(self, ctx: Context, storage: CommandStackStorage, interval_send_task: IntervalSendTask, registry: SendRegistry):
         self._ctx = ctx
+        self._svc = ctx.svc
+        self._utils = ctx.utils
         self._storage = storage
         self._interval_send_task = interval_send_task
+        self._registry = registry
+        cfg = ctx.cfg.send_executor
+        self._executor = SendExecutor(cfg.loop_count, cfg.max_running_sends, cfg.max_pending_sends, self._svc.log_exception)
 
-    def send_command_stack(self, source: CommandSource, name: str, condition='', unless=False):
-        sender = CommandStackSender(self._ctx, source, self._storage)
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        loop.run_until_complete(sender.send_command_stack(name, condition, unless))
-        loop.close()
+    def send_command_stack(self, source: CommandSource, name: str, condition='', unless=False, trace: bool = False, dry_run: bool = False):
+        send_trace = SendTrace(name, dry_run) if trace or dry_run else None
+        if self._executor.submit(lambda: self._send_command_stack(source, name, condition, unless, send_trace)) is None:
+            self._svc.print(source, self._svc.tr('send_command_stack.busy', name))
+
+    async def _send_command_stack(self, source: CommandSource, name: str, condition='', unless=False, trace: Optional[SendTrace] = None):
+        perm = self._storage.get(name).perm if self._storage.contains(name) else 0
+        running = self._registry.register(name, source, self._utils.get_user(source), perm)
+        try:
+            sender = CommandStackSender(self._ctx, source, self._storage, running, trace)
+            await sender.send_command_stack(name, condition, unless)
+        finally:
+            self._registry.unregister(running)
+
+        if trace is not None:
+            self._print_trace(source, trace)
+            if trace.dry_run:
+                return
 
         if not isinstance(source, PluginCommandSource):
             stack = self._storage.get(name)
             if ACTime.not_zero(stack.interval):
                 self._interval_send_task.start_timed_stack(name)
 
+    def _print_trace(self, source: CommandSource, trace: SendTrace):
+        root = trace.root
+        header = self._svc.tr('send_command_stack.trace.dry_run_header' if trace.dry_run else 'send_command_stack.trace.header', trace.name, round(root.elapsed, 3))
+        self._svc.print(source, RTextList(header, *self._trace_timing(root)))
+        lines: List[RTextBase] = []
+        for node in root.children:
+            self._const_trace_node(node, 0, lines)
+        for line in lines:
+            self._svc.print(source, line)
+
+    def _const_trace_node(self, node: TraceNode, depth: int, lines: List[RTextBase]):
+        indent = '  ' * depth
+        lines.append(RTextList(indent, self._utils.click_info(RText(node.name, RColor.gold)), RText(f' {node.elapsed:.3f}s', RColor.aqua)))
+        for record in node.lines:
+            text = record.text.replace('\n', ' | ')
+            lines.append(RTextList(
+                f'{indent}  ',
+                RText(f'#{record.line} ', RColor.gray),
+                RText(f'[{record.category}] ', RColor.dark_aqua),
+                text,
+                RText(f' {record.elapsed:.3f}s', RColor.aqua),
+                *self._trace_timing(record)
+            ))
+            for child in record.children:
+                self._const_trace_node(child, depth + 2, lines)
+
+    def _trace_timing(self, record: TraceLine) -> List[RTextBase]:
+        timing = []
+        if record.wait > 0:
+            timing.append(RTextList(' ', self._svc.tr('send_command_stack.trace.wait', round(record.wait, 3))))
+        if record.condition_result is not None:
+            timing.append(RTextList(' ', self._svc.tr('send_command_stack.trace.condition', round(record.condition, 3), record.condition_result)))
+        return timing
+
+    def stop(self):
+        self._executor.stop()
@@ -13,6 +13,9 @@ from auto_command.task.send_cmd_stack_task import SendCommandStackTask
 from auto_command.task.interval_send_task import IntervalSendTask
 from auto_command.task.cmd_perm_task import CommandPermTask
 from auto_command.task.record_cmd_stack_task import RecordCommandStackTask
+from auto_command.task.hot_reload_task import HotReloadTask
+from auto_command.task.running_send_task import RunningSendTask
+from auto_command.tools.send_registry import SendRegistry
 
 
 class TaskManager:
@@ -22,12 +25,15 @@ class TaskManager:
         self._help_msg_task = HelpMessageTask(ctx)
         self._list_cmd_stack_task = ListCommandStackTask(ctx, cmd_stack_storage)
         self._interval_send_task = IntervalSendTask(ctx, cmd_stack_storage, self.send_command_stack)
-        self._send_cmd_stack_task = SendCommandStackTask(ctx, cmd_stack_storage, self._interval_send_task)
+        self._send_registry = SendRegistry()
+        self._send_cmd_stack_task = SendCommandStackTask(ctx, cmd_stack_storage, self._interval_send_task, self._send_registry)
+        self._running_send_task = RunningSendTask(ctx, self._send_registry)
         self._edit_cmd_stack_info_task = EditCommandStackInfoTask(ctx, cmd_stack_storage, self._interval_send_task)
         self._info_cmd_stack_task = InfoCommandStackTask(ctx, cmd_stack_storage)
         self._cmd_perm_task = CommandPermTask(ctx, cmd_stack_storage)
         self._edit_cmd_in_stack_task = EditCommandInStackTask(ctx, cmd_stack_storage, self._cmd_perm_task)
         self._record_cmd_stack_task = RecordCommandStackTask(ctx, cmd_stack_storage, self._edit_cmd_in_stack_task, self._cmd_perm_task)
+        self._hot_reload_task = HotReloadTask(ctx, cmd_stack_storage, self._interval_send_task)
 
     @new_thread
     def print_simple_help_message(self, source: CommandSource):
@@ -41,9 +47,16 @@ class TaskManager:
     def list_command_stack(self, source: CommandSource, *, keyword: Optional[str] = None, page: Optional[int] = None):
         self._list_cmd_stack_task.list_command_stack(source, keyword, page)
 
+    def send_command_stack(self, source: CommandSource, name: str, condition='', unless=False, trace: bool = False, dry_run: bool = False):
+        self._send_cmd_stack_task.send_command_stack(source, name, condition, unless, trace, dry_run)
+
+    @new_thread
+    def list_running_sends(self, source: CommandSource):
+        self._running_send_task.list_running_sends(source)
+
     @new_thread
-    def send_command_stack(self, source: CommandSource, name: str, condition='', unless=False):
-        self._send_cmd_stack_task.send_command_stack(source, name, condition, unless)
+    def cancel_send(self, source: CommandSource, send_id: int):
+        self._running_send_task.cancel_send(source, send_id)
 
     @new_thread
     def make_command_stack(self, source: CommandSource, name: str, perm: int, time: str = '0', desc: str = ''):
@@ -93,6 +106,10 @@ class TaskManager:
     def print_wait_help(self, source: CommandSource, time: str):
         self._help_msg_task.print_wait_help(source, time)
 
+    @new_thread
+    def print_parallel_help(self, source: CommandSource):
+        self._help_msg_task.print_parallel_help(source)
+
     @new_thread
     def print_perm_help(self, source: CommandSource, regex: str, white: bool = True):
         self._help_msg_task.print_perm_help(source, regex, white)
@@ -120,3 +137,12 @@ class TaskManager:
 
     def stop_timed_stacks(self):
         self._interval_send_task.stop_timed_stacks()
+
+    def stop_sending(self):
+        self._send_cmd_stack_task.stop()
+
+    def start_hot_reload(self):
+        self._hot_reload_task.start()
+
+    def stop_hot_reload(self):
+        self._hot_reload_task.stop()
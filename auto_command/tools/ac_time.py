@@ -1,130 +1,104 @@
 import re
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
 import asyncio
 
 from mcdreforged.api.all import *
 
-from auto_command.tools.tick_data_getter import TickDataGetter
+from auto_command.tools.tick_clock import TickClock
 from auto_command.exceptions import ACTimeFormatMismatchException
-from auto_command.constant import COMMAND_TIMEOUT
-from auto_command.exceptions import ACGetGametickTimeoutException
+
+
+class Duration(NamedTuple):
+    """
+    A parsed time, an amount of seconds or of game ticks
+    """
+    amount: float
+    is_tick: bool
+
+    @property
+    def is_zero(self) -> bool:
+        return self.amount == 0
+
+    @property
+    def seconds(self) -> float:
+        """
+        Ticks are converted at the normal 20 ticks per second
+        """
+        return self.amount / 20 if self.is_tick else self.amount
 
 
 class ACTime:
-    _format: Dict[str, str] = {
-        'tick': r"^(\d+)(?i:tick|t)",
-        'second': r"^(\d+\.\d+|\.\d+|\d+)(?i:second|sec|s)",
-        'minute': r"^(\d+\.\d+|\.\d+|\d+)(?i:minute|min|m)",
-        'hour': r"^(\d+\.\d+|\.\d+|\d+)(?i:hour|hr|h)",
-        'day': r"^(\d+\.\d+|\.\d+|\d+)(?i:day|d)",
-        'week': r"^(\d+\.\d+|\.\d+|\d+)(?i:week|wk|w)",
+    # a number and its unit in one pass, the unit is looked up in _units
+    _grammar: re.Pattern = re.compile(r'(\d+\.\d+|\.\d+|\d+)([a-zA-Z]*)')
+    # unit: (seconds per unit, or 1 for ticks, is tick)
+    _units: Dict[str, Tuple[float, bool]] = {
+        'tick': (1, True), 't': (1, True),
+        'second': (1, False), 'sec': (1, False), 's': (1, False),
+        'minute': (60, False), 'min': (60, False), 'm': (60, False),
+        'hour': (60 * 60, False), 'hr': (60 * 60, False), 'h': (60 * 60, False),
+        'day': (60 * 60 * 24, False), 'd': (60 * 60 * 24, False),
+        'week': (60 * 60 * 24 * 7, False), 'wk': (60 * 60 * 24 * 7, False), 'w': (60 * 60 * 24 * 7, False),
     }
 
-    def __init__(self, tick_data_getter: TickDataGetter):
-        self._tick_data_getter = tick_data_getter
-        self._tps_gettable: bool = tick_data_getter.tps_gettable
+    def __init__(self, tick_clock: TickClock):
+        self._tick_clock = tick_clock
 
     @classmethod
     def is_time_format(cls, time: str) -> bool:
-        if re.fullmatch(r'^(?:\d+\.\d+|\.\d+|\d+)$', time):
-            return True
-        for pattern in cls._format.values():
-            if re.fullmatch(pattern, time):
-                return True
-        return False
+        """
+        A bare number is a valid time, it takes the default unit of where it is used
+        """
+        return cls.try_parse(time, 's') is not None
 
     @staticmethod
     def to_time(time: str, postfix: str) -> str:
-        if re.fullmatch(r'^(?:\d+\.\d+|\.\d+|\d+)$', time):
+        m = ACTime._grammar.fullmatch(time)
+        if m is not None and m.group(2) == '':
             time += postfix
         return time
 
+    @classmethod
+    def parse(cls, time: str, default_post: str) -> Duration:
+        duration = cls.try_parse(time, default_post)
+        if duration is None:
+            raise ACTimeFormatMismatchException(cls.to_time(time, default_post))
+        return duration
+
     @staticmethod
-    def get_number(time: str) -> float:
-        if m := re.match(r'^(\d+\.\d+|\.\d+|\d+)', time):
-            return float(m.group(1))
+    @lru_cache(maxsize=1024)
+    def try_parse(time: str, default_post: str) -> Optional[Duration]:
+        m = ACTime._grammar.fullmatch(time)
+        if m is None:
+            return None
+        number, unit = m.groups()
+        factor = ACTime._units.get((unit or default_post).lower())
+        if factor is None:
+            return None
+        per_unit, is_tick = factor
+        if is_tick and not number.isdigit():
+            return None  # no fractions of a tick
+        return Duration(float(number) * per_unit, is_tick)
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def is_zero(time: str) -> bool:
-        return ACTime.get_number(time) == 0
+        duration = ACTime.try_parse(time, 's')
+        return duration is not None and duration.is_zero
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def not_zero(time: str) -> bool:
-        return ACTime.get_number(time) != 0
-
-    async def sleep(self, time: str, default_post: str):
-        time = self.to_time(time, default_post)
-        if not self.is_time_format(time):
-            raise ACTimeFormatMismatchException(time)
+        return not ACTime.is_zero(time)
 
-        n, sec = self._time_to_s(time)
-        if sec:
-            await asyncio.sleep(n)
+    async def sleep(self, duration: Duration):
+        if duration.is_tick:
+            await self._tick_clock.sleep_ticks(int(duration.amount))
         else:
-            await self._sleep_tick(int(n))
-
-    async def _get_gametick(self) -> int:
-        gt: int = self._tick_data_getter.get_gametick(timeout=COMMAND_TIMEOUT)
-        if gt is None:
-            raise ACGetGametickTimeoutException
-        return gt
-
-    async def _tick_step(self):
-        await self._get_gametick()
-
-    async def _sleep_tick(self, t: int):
-        if t <= 3:
-            for _ in range(t):
-                await self._tick_step()
-            return
-
-        tps: float = 20
-
-        if self._tps_gettable:
-            tps = self._tick_data_getter.get_tps(timeout=COMMAND_TIMEOUT)
-            t -= 1
-
-        start_gt: int = await self._get_gametick()
-        t -= 1
-
-        target_gt: int = start_gt + t
-        wait_sec: float
-        current_gt: int
-        while True:
-            wait_sec = (t - 1) / tps  # -1tick for the time of get gametick func
-            # TODO tick freeze case
-
-            await asyncio.sleep(wait_sec)
-
-            current_gt = await self._get_gametick()  # -1tick
-
-            if current_gt >= target_gt:
-                return
-            else:
-                tps = (current_gt - start_gt) / wait_sec
-                t = target_gt - current_gt
-                start_gt = current_gt
-
-    @classmethod
-    def _time_to_s(cls, time: str) -> tuple[float, bool]:
-        unit: str = ''
-        n: float = 0
-        for u in cls._format:
-            match = re.fullmatch(cls._format[u], time)
-            if match:
-                unit = u
-                n = float(match.group(1))
-                break
-        if unit == 'tick':
-            return n, False
-        elif unit == 'second':
-            return n, True
-        elif unit == 'minute':
-            return n * 60, True
-        elif unit == 'hour':
-            return n * 60 * 60, True
-        elif unit == 'day':
-            return n * 60 * 60 * 24, True
-        elif unit == 'week':
-            return n * 60 * 60 * 24 * 7, True
+            await asyncio.sleep(duration.amount)
 
+    async def acknowledge(self):
+        """
+        Returns once the server has executed every command sent before, without waiting for a tick
+        """
+        await self._tick_clock.sleep_ticks(1)
@@ -0,0 +1,45 @@
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from auto_command.exceptions import ACRecursionException, ACSendDepthException
+
+
+class CallStack:
+    """
+    Chain of stacks being sent by one task, pushing a stack already in the chain raises the cycle it closes
+
+    An async sub-send continues on a copy, so sibling sub-sends don't see each other
+    """
+
+    __slots__ = ('_names', '_index', '_max_depth')
+
+    def __init__(self, max_depth: int):
+        self._names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._max_depth: int = max_depth
+
+    @property
+    def depth(self) -> int:
+        return len(self._names)
+
+    def push(self, name: str):
+        index = self._index.get(name)
+        if index is not None:
+            raise ACRecursionException(name, self._names[index:] + [name])
+        if 0 < self._max_depth <= len(self._names):
+            raise ACSendDepthException(self._max_depth, self._names + [name])
+        self._index[name] = len(self._names)
+        self._names.append(name)
+
+    def pop(self):
+        self._index.pop(self._names.pop())
+
+    def copy(self) -> 'CallStack':
+        other = CallStack(self._max_depth)
+        other._names = list(self._names)
+        other._index = dict(self._index)
+        return other
+
+
+# the chain of the task running, asyncio tasks each have their own context
+current_call_stack: ContextVar[Optional[CallStack]] = ContextVar('current_call_stack', default=None)
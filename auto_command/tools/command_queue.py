@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import time
+from concurrent.futures import Future
+from threading import Condition, Thread
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+
+class CommandQueueMetrics(NamedTuple):
+    depth: int
+    max_depth: int
+    dispatched: int
+    average_wait: float  # seconds a dispatched command spent in the queue
+
+
+class CommandQueue:
+    """
+    Outbound MC commands, dispatched by a token bucket of rate commands per second holding up to burst tokens
+
+    Commands with a higher priority go first, commands with the same priority keep their order.
+    A rate of 0 disables the limit and commands are executed right away
+    """
+
+    def __init__(self, execute: Callable[[str], None], rate: float, burst: int, log_callback: Callable[[str], None]):
+        self._execute = execute
+        self._rate: float = max(0.0, rate)
+        self._burst: int = max(1, burst)
+        self._log_callback = log_callback
+        self._cond = Condition()
+        self._heap: List[Tuple[int, int, str, int, Future, float]] = []
+        self._seq = itertools.count()
+        self._tokens: float = self._burst
+        self._refilled: float = time.monotonic()
+        self._max_depth: int = 0
+        self._dispatched: int = 0
+        self._total_wait: float = 0
+        self._closed: bool = False
+        self._thread: Optional[Thread] = None
+
+    @property
+    def limited(self) -> bool:
+        return self._rate > 0
+
+    def submit(self, command: str, priority: int = 0, cost: int = 1) -> Future:
+        """
+        :param cost: Tokens taken by the command, a batch of several command lines costs one token per line
+        """
+        future = Future()
+        if not self.limited:
+            future.set_running_or_notify_cancel()
+            try:
+                self._execute(command)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+            with self._cond:
+                self._dispatched += cost
+            return future
+
+        with self._cond:
+            heapq.heappush(self._heap, (-priority, next(self._seq), command, cost, future, time.monotonic()))
+            self._max_depth = max(self._max_depth, len(self._heap))
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = Thread(target=self._thread_main, name='AutoCommand-CommandQueue', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return future
+
+    def metrics(self) -> CommandQueueMetrics:
+        with self._cond:
+            average_wait = self._total_wait / self._dispatched if self._dispatched else 0
+            return CommandQueueMetrics(len(self._heap), self._max_depth, self._dispatched, average_wait)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for entry in self._heap:
+                entry[4].cancel()
+            self._heap.clear()
+            self._cond.notify_all()
+
+    def _take_tokens(self, cost: int) -> float:
+        """
+        :return: 0 if the tokens are taken, otherwise seconds until enough tokens are refilled
+        """
+        # a batch larger than the bucket waits for a full bucket
+        cost = min(cost, self._burst)
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._refilled) * self._rate)
+        self._refilled = now
+        if self._tokens >= cost:
+            self._tokens -= cost
+            return 0
+        return (cost - self._tokens) / self._rate
+
+    def _thread_main(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                cost = self._heap[0][3]
+                delay = self._take_tokens(cost)
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, command, cost, future, enqueued = heapq.heappop(self._heap)
+                if not future.set_running_or_notify_cancel():
+                    # the sender is gone, give the tokens back
+                    self._tokens += min(cost, self._burst)
+                    continue
+                self._dispatched += cost
+                self._total_wait += (time.monotonic() - enqueued) * cost
+            try:
+                self._execute(command)
+            except Exception as e:
+                self._log_callback(f'Fail to execute command {command}: {e}')
+                future.set_exception(e)
+            else:
+                future.set_result(None)
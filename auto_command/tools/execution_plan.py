@@ -0,0 +1,184 @@
+import re
+from collections import OrderedDict
+from threading import Lock
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from auto_command.constant import DEFAULT_WAIT_UNIT
+from auto_command.tools.ac_time import ACTime, Duration
+
+
+class McCommandOp(NamedTuple):
+    command: str
+
+
+class McCommandBatchOp(NamedTuple):
+    """
+    Consecutive MC command lines submitted to the server in one write
+    """
+    commands: Tuple[str, ...]
+
+
+class PlayerOp(NamedTuple):
+    command: str
+
+
+class PlayerSpawnOp(NamedTuple):
+    command: str
+
+
+class McdrCommandOp(NamedTuple):
+    command: str
+
+
+class SendOp(NamedTuple):
+    name: str
+    is_async: bool
+    condition_type: Optional[str]  # 'if', 'unless' or None
+    condition: Optional[str]
+
+
+class ParallelOp(NamedTuple):
+    names: Tuple[str, ...]
+    is_async: bool
+    timeout: Optional[str]
+    timeout_duration: Optional[Duration]  # None without a timeout or if it is malformed, which fails when the line runs
+
+
+class WaitOp(NamedTuple):
+    time: str
+    duration: Optional[Duration]  # None if the time is malformed, it fails when the line runs
+
+
+class MessageOp(NamedTuple):
+    text: str
+
+
+class DynamicOp(NamedTuple):
+    """
+    Line with $...$ placeholders, it is interpreted for the sending source and compiled at runtime
+    """
+    text: str
+
+
+Op = Union[McCommandOp, McCommandBatchOp, PlayerOp, PlayerSpawnOp, McdrCommandOp, SendOp, ParallelOp, WaitOp, MessageOp, DynamicOp]
+
+
+class ExecutionPlan(NamedTuple):
+    source: tuple
+    ops: Tuple[Op, ...]
+    batch_size: int  # longest run of MC commands merged into one McCommandBatchOp, 1 for no batching
+
+
+class ExecutionPlanCompiler:
+    _placeholder = re.compile(r'\$(.*?)\$')
+    _player = re.compile(r'^/player .+')
+    _player_spawn = re.compile(r'^/player (.*) spawn')
+    _name = re.compile(r'"[^"]+"|\S+')
+
+    def __init__(self, prefix: str):
+        self._prefix = prefix
+        self._send = re.compile(r'^{} send ("[^"]+"|\S+)(?:\s+(async))?(?:\s+(if|unless)\s+(.+))?$'.format(re.escape(prefix)))
+        self._wait = re.compile(r'^{} wait (\S+)'.format(re.escape(prefix)))
+        self._parallel = re.compile(r'^{} parallel (.+)$'.format(re.escape(prefix)))
+
+    def compile_line(self, cmd: str, interpreted: bool = False) -> Op:
+        if not interpreted and self._placeholder.search(cmd):
+            return DynamicOp(cmd)
+        if cmd[:2] == '!!':
+            if cmd.startswith(self._prefix):
+                if m := self._send.match(cmd):
+                    cs_name = m.group(1)
+                    if cs_name.startswith('"') and cs_name.endswith('"'):
+                        cs_name = cs_name[1:-1]
+                    return SendOp(cs_name, m.group(2) == 'async', m.group(3), m.group(4))
+                if m := self._wait.match(cmd):
+                    return WaitOp(m.group(1), ACTime.try_parse(m.group(1), DEFAULT_WAIT_UNIT))
+                if m := self._parallel.match(cmd):
+                    if op := self._compile_parallel(m.group(1)):
+                        return op
+            return McdrCommandOp(cmd)
+        elif cmd[:1] == '/':
+            if self._player.match(cmd):
+                if self._player_spawn.match(cmd):
+                    return PlayerSpawnOp(cmd)
+                return PlayerOp(cmd)
+            return McCommandOp(cmd)
+        return MessageOp(cmd)
+
+    def _compile_parallel(self, args: str) -> Optional[ParallelOp]:
+        """
+        <name> <name> ... [async] [timeout <time>], names may be quoted
+        """
+        tokens = self._name.findall(args)
+        is_async = False
+        timeout = None
+        while tokens:
+            if tokens[-1] == 'async' and not is_async:
+                is_async = True
+                tokens.pop()
+            elif len(tokens) >= 2 and tokens[-2] == 'timeout' and timeout is None:
+                timeout = tokens.pop()
+                tokens.pop()
+            else:
+                break
+        if not tokens:
+            return None
+        names = tuple(t[1:-1] if t.startswith('"') and t.endswith('"') else t for t in tokens)
+        timeout_duration = None if timeout is None else ACTime.try_parse(timeout, DEFAULT_WAIT_UNIT)
+        return ParallelOp(names, is_async, timeout, timeout_duration)
+
+    def compile(self, command: tuple, batch_size: int = 1) -> ExecutionPlan:
+        ops = [self.compile_line(cmd) for cmd in command]
+        if batch_size > 1:
+            ops = self._batch(ops, batch_size)
+        return ExecutionPlan(command, tuple(ops), batch_size)
+
+    @staticmethod
+    def _batch(ops: List[Op], batch_size: int) -> List[Op]:
+        batched = []
+        run = []
+
+        def flush_run():
+            for i in range(0, len(run), batch_size):
+                chunk = run[i:i + batch_size]
+                batched.append(McCommandOp(chunk[0]) if len(chunk) == 1 else McCommandBatchOp(tuple(chunk)))
+            run.clear()
+
+        for op in ops:
+            if isinstance(op, McCommandOp):
+                run.append(op.command)
+            else:
+                flush_run()
+                batched.append(op)
+        flush_run()
+        return batched
+
+
+class ExecutionPlanCache:
+    """
+    Compiled plans by stack name, a plan is recompiled once the command lines of its stack change
+    """
+
+    def __init__(self, prefix: str, max_size: int = 256):
+        self._compiler = ExecutionPlanCompiler(prefix)
+        self._max_size = max_size
+        self._plans: 'OrderedDict[str, ExecutionPlan]' = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def compiler(self) -> ExecutionPlanCompiler:
+        return self._compiler
+
+    def get(self, name: str, command: tuple, batch_size: int = 1) -> ExecutionPlan:
+        with self._lock:
+            plan = self._plans.get(name)
+            if plan is not None and plan.batch_size == batch_size and (plan.source is command or plan.source == command):
+                self._plans.move_to_end(name)
+                return plan
+        plan = self._compiler.compile(command, batch_size)
+        with self._lock:
+            self._plans[name] = plan
+            self._plans.move_to_end(name)
+            while len(self._plans) > self._max_size:
+                self._plans.popitem(last=False)
+        return plan
@@ -1,46 +1,30 @@
-from contextlib import contextmanager
-from queue import Queue, Empty
+import re
 
 from mcdreforged.api.all import *
 
 from auto_command.mcdr.mcdr_service import Service
+from auto_command.tools.query_task import TokenQueryTask
 
 
 class InfoGetter:
-    class QueryTask:
-        def __init__(self):
-            self.querying_amount = 0
-            self.result_queue = Queue()
-
-        def is_querying(self):
-            return self.querying_amount > 0
-
-        @contextmanager
-        def with_querying(self):
-            self.querying_amount += 1
-            try:
-                yield
-            finally:
-                self.querying_amount -= 1
+    _result_regex = re.compile(r'ACInfo(\d+)(True|False)')
 
     def __init__(self, svc: Service):
         self._svc = svc
-        self._info = self.QueryTask()
-
-    def if_condition(self, timeout: float, condition: str, unless: bool = False) -> bool:
-        cmd_t = f'/execute {"unless" if unless else "if"} {condition} run say ACInfoTrue'
-        cmd_f = f'/execute {"if" if unless else "unless"} {condition} run say ACInfoFalse'
-        with self._info.with_querying():
-            self._svc.exec_mc_cmd(cmd_t)
-            self._svc.exec_mc_cmd(cmd_f)
-            try:
-                return self._info.result_queue.get(timeout=timeout)
-            except Empty:
-                return False
+        self._info = TokenQueryTask()
+
+    async def if_condition(self, timeout: float, condition: str, unless: bool = False) -> bool:
+        result = await self._info.query_async(lambda token: self._send_condition(token, condition, unless), timeout)
+        return result is True
+
+    def _send_condition(self, token: int, condition: str, unless: bool):
+        cmd_t = f'/execute {"unless" if unless else "if"} {condition} run say ACInfo{token}True'
+        cmd_f = f'/execute {"if" if unless else "unless"} {condition} run say ACInfo{token}False'
+        self._svc.exec_mc_cmd(cmd_t)
+        self._svc.exec_mc_cmd(cmd_f)
 
     def on_info(self, info: Info):
         if not info.is_user:
             if self._info.is_querying():
-                if 'ACInfo' in info.content:
-                    self._info.result_queue.put('ACInfoTrue' in info.content)
-
+                if (m := self._result_regex.search(info.content)) is not None:
+                    self._info.resolve(int(m.group(1)), m.group(2) == 'True')
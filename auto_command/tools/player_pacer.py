@@ -0,0 +1,40 @@
+from typing import Awaitable, Callable
+
+
+class PlayerPacer:
+    """
+    Paces a run of consecutive /player commands in one stack
+
+    fixed: waits 1 tick after every command
+    window: waits 1 tick after every window_size commands and after the last one
+    ack: doesn't wait between commands, once the run ends it waits until the server has executed all of them
+    """
+
+    MODES = ('fixed', 'window', 'ack')
+
+    def __init__(self, mode: str, window_size: int, sleep_tick: Callable[[], Awaitable], acknowledge: Callable[[], Awaitable]):
+        self._mode: str = mode if mode in self.MODES else 'fixed'
+        self._window_size: int = max(1, window_size)
+        self._sleep_tick = sleep_tick
+        self._acknowledge = acknowledge
+        self._run: int = 0
+
+    async def sent(self):
+        """
+        Called after each /player command
+        """
+        self._run += 1
+        if self._mode == 'fixed' or (self._mode == 'window' and self._run % self._window_size == 0):
+            await self._sleep_tick()
+
+    async def flush(self):
+        """
+        Called before any other line and at the end of the stack, ends the current run
+        """
+        if self._run == 0:
+            return
+        run, self._run = self._run, 0
+        if self._mode == 'window' and run % self._window_size != 0:
+            await self._sleep_tick()
+        elif self._mode == 'ack':
+            await self._acknowledge()
@@ -0,0 +1,179 @@
+import asyncio
+import itertools
+import time
+from concurrent.futures import Future, TimeoutError
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+
+Waiter = Callable[[Any], None]
+
+
+def _blocking_waiter() -> tuple[Future, Waiter]:
+    future = Future()
+
+    def waiter(result: Any):
+        if not future.done():
+            future.set_result(result)
+
+    return future, waiter
+
+
+def _async_waiter() -> tuple[asyncio.Future, Waiter]:
+    """
+    The waiter may be called from any thread, the future is resolved on its own loop with call_soon_threadsafe
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result: Any):
+        if not future.done():
+            future.set_result(result)
+
+    def waiter(result: Any):
+        try:
+            loop.call_soon_threadsafe(set_result, result)
+        except RuntimeError:
+            pass  # the loop is closed
+
+    return future, waiter
+
+
+class QueryTask:
+    """
+    Callers of one kind of query whose responses can't be told apart, like the gametime
+
+    At most one query is in flight, callers arriving meanwhile join the next one which is sent once the response comes,
+    so one response fans out to every caller and the traffic doesn't grow with them. Responses are matched to queries
+    in order, the late response of a query that timed out is dropped as stale instead of answering a newer query.
+    It is only expected for one more timeout, so a response that is lost rather than late costs a newer query
+    its answer at most once
+    """
+
+    class _Round:
+        __slots__ = ('waiters', 'shifted')
+
+        def __init__(self):
+            self.waiters: List[Waiter] = []
+            self.shifted: bool = False  # a response was dropped as stale while it was in flight
+
+    def __init__(self, send: Callable[[], None]):
+        self._send = send
+        self._lock = Lock()
+        self._in_flight: Optional[QueryTask._Round] = None
+        self._next: Optional[QueryTask._Round] = None
+        self._late: int = 0
+        self._late_until: float = 0
+
+    def is_querying(self) -> bool:
+        return self._in_flight is not None or self._late > 0
+
+    def query(self, timeout: float) -> Optional[Any]:
+        future, waiter = _blocking_waiter()
+        query_round = self._join(waiter)
+        timed_out = False
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            timed_out = True
+            return None
+        finally:
+            self._leave(query_round, waiter, timed_out, timeout)
+
+    def resolve(self, result: Any):
+        with self._lock:
+            if self._late > 0:
+                self._late = 0
+                if time.monotonic() <= self._late_until:
+                    if self._in_flight is not None:
+                        self._in_flight.shifted = True
+                    return
+            query_round = self._in_flight
+            if query_round is None:
+                return
+            waiters = list(query_round.waiters)
+            send = self._promote()
+        for waiter in waiters:
+            waiter(result)
+        if send:
+            self._send()
+
+    def _join(self, waiter: Waiter) -> '_Round':
+        with self._lock:
+            send = self._in_flight is None
+            if send:
+                query_round = self._in_flight = self._Round()
+            else:
+                if self._next is None:
+                    self._next = self._Round()
+                query_round = self._next
+            query_round.waiters.append(waiter)
+        if send:
+            self._send()
+        return query_round
+
+    def _leave(self, query_round: '_Round', waiter: Waiter, timed_out: bool, timeout: float):
+        abandoned: List[Waiter] = []
+        send = False
+        with self._lock:
+            if waiter in query_round.waiters:
+                query_round.waiters.remove(waiter)
+            if query_round is self._next and not query_round.waiters:
+                self._next = None
+            elif timed_out and query_round is self._in_flight:
+                # the response is late or lost, a late one is dropped when it comes. If a response was already dropped
+                # while this query was in flight, that was most likely its own and the previous one was lost
+                self._late = 0 if query_round.shifted else 1
+                self._late_until = time.monotonic() + timeout
+                abandoned = list(query_round.waiters)
+                send = self._promote()
+        for other in abandoned:
+            other(None)
+        if send:
+            self._send()
+
+    def _promote(self) -> bool:
+        self._in_flight, self._next = self._next, None
+        return self._in_flight is not None
+
+
+class TokenQueryTask:
+    """
+    Callers of a query whose response echoes a token, each query gets a unique token and only its own response,
+    responses with a token nobody waits for anymore are dropped
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._tokens = itertools.count(1)
+        self._waiters: Dict[int, Waiter] = {}
+
+    def is_querying(self) -> bool:
+        return len(self._waiters) > 0
+
+    async def query_async(self, send: Callable[[int], None], timeout: float) -> Optional[Any]:
+        future, waiter = _async_waiter()
+        token = self._add(waiter)
+        try:
+            send(token)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._remove(token)
+
+    def resolve(self, token: int, result: Any):
+        with self._lock:
+            waiter = self._waiters.pop(token, None)
+        if waiter is not None:
+            waiter(result)
+
+    def _add(self, waiter: Waiter) -> int:
+        with self._lock:
+            token = next(self._tokens)
+            self._waiters[token] = waiter
+        return token
+
+    def _remove(self, token: int):
+        with self._lock:
+            self._waiters.pop(token, None)
@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import time
+from threading import Condition, Thread
+from typing import Callable, List, Optional, Tuple
+
+
+class ScheduledHandle:
+    __slots__ = ('deadline', 'callback', 'cancelled', '_scheduler')
+
+    def __init__(self, scheduler: 'Scheduler', deadline: float, callback: Callable[[], None]):
+        self.deadline: float = deadline
+        self.callback: Callable[[], None] = callback
+        self.cancelled: bool = False
+        self._scheduler: 'Scheduler' = scheduler
+
+    def cancel(self):
+        self._scheduler.cancel(self)
+
+
+class Scheduler:
+    """
+    Runs callbacks at their deadlines from one heap on one thread, scheduling is O(log n)
+    and cancelling is O(1), cancelled entries are dropped lazily and compacted once they are the majority
+
+    Callbacks run on the scheduler thread and should return quickly. The thread exits when nothing is scheduled
+    """
+
+    def __init__(self, log_callback: Callable[[str], None], name: str = 'AutoCommand-Scheduler'):
+        self._log_callback = log_callback
+        self._name = name
+        self._cond = Condition()
+        self._heap: List[Tuple[float, int, ScheduledHandle]] = []
+        self._seq = itertools.count()
+        self._cancelled: int = 0
+        self._thread: Optional[Thread] = None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap) - self._cancelled
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> ScheduledHandle:
+        with self._cond:
+            handle = ScheduledHandle(self, time.monotonic() + max(0.0, delay), callback)
+            heapq.heappush(self._heap, (handle.deadline, next(self._seq), handle))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._thread_main, name=self._name, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return handle
+
+    def cancel(self, handle: ScheduledHandle):
+        with self._cond:
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            self._cancelled += 1
+            if self._cancelled > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+            self._cond.notify_all()
+
+    def _thread_main(self):
+        while True:
+            with self._cond:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                if not self._heap:
+                    self._thread = None
+                    return
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, handle = heapq.heappop(self._heap)
+                # marked so that cancelling it from now on is a no-op
+                handle.cancelled = True
+            try:
+                handle.callback()
+            except Exception as e:
+                self._log_callback(f'Fail to run scheduled callback: {e}')
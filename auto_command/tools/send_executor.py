@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Coroutine, Deque, List, Optional, Tuple
+
+
+class _LoopWorker:
+    def __init__(self, index: int, log_callback: Callable[[str], None]):
+        self.loop = asyncio.new_event_loop()
+        self.running: int = 0
+        self._log_callback = log_callback
+        self._thread = threading.Thread(target=self._thread_main, name=f'AutoCommand-Sender-{index}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _thread_main(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            except Exception:
+                self._log_callback(f'Fail to shut down the loop of {self._thread.name}')
+            self.loop.close()
+
+    def stop(self):
+        def stopper():
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.call_soon(self.loop.stop)
+
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(stopper)
+
+
+class SendExecutor:
+    """
+    Runs stack sends on a small pool of long-lived event loops instead of a thread and a loop per send
+
+    At most max_running sends run at the same time, further sends wait in a queue of max_pending,
+    and sends beyond that are rejected. A send that raises is reported to log_callback, called inside the except block
+    """
+
+    def __init__(self, loop_count: int, max_running: int, max_pending: int, log_callback: Callable[[str], None]):
+        self._loop_count: int = max(1, loop_count)
+        self._max_running: int = max(1, max_running)
+        self._max_pending: int = max(0, max_pending)
+        self._log_callback = log_callback
+        self._workers: List[_LoopWorker] = []
+        self._pending: Deque[Tuple[Callable[[], Coroutine], Future]] = deque()
+        self._running: int = 0
+        # reentrant, a send that is already done runs its done callback inside _start
+        self._lock = threading.RLock()
+
+    def _ensure_started(self):
+        if not self._workers:
+            self._workers = [_LoopWorker(i, self._log_callback) for i in range(self._loop_count)]
+            for worker in self._workers:
+                worker.start()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def submit(self, coro_factory: Callable[[], Coroutine]) -> Optional[Future]:
+        """
+        :return: A future of the send result, or None if the send is rejected because the queue is full
+        """
+        future = Future()
+        with self._lock:
+            self._ensure_started()
+            if self._running < self._max_running:
+                self._start(coro_factory, future)
+            elif len(self._pending) < self._max_pending:
+                self._pending.append((coro_factory, future))
+            else:
+                return None
+        return future
+
+    def _start(self, coro_factory: Callable[[], Coroutine], future: Future):
+        worker = min(self._workers, key=lambda w: w.running)
+        worker.running += 1
+        self._running += 1
+
+        def on_done(inner: Future):
+            with self._lock:
+                worker.running -= 1
+                self._running -= 1
+                if self._pending:
+                    self._start(*self._pending.popleft())
+            if future.done():
+                return
+            if inner.cancelled():
+                future.cancel()
+            elif inner.exception() is not None:
+                future.set_exception(inner.exception())
+            else:
+                future.set_result(inner.result())
+
+        asyncio.run_coroutine_threadsafe(self._run(coro_factory), worker.loop).add_done_callback(on_done)
+
+    async def _run(self, coro_factory: Callable[[], Coroutine]):
+        # callers may drop the future, so errors that escape the send are logged here
+        try:
+            return await coro_factory()
+        except Exception:
+            self._log_callback('Unhandled error in a command stack send')
+            raise
+
+    def stop(self):
+        with self._lock:
+            while self._pending:
+                self._pending.popleft()[1].cancel()
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,67 @@
+import asyncio
+import itertools
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+from mcdreforged.api.all import *
+
+
+class RunningSend:
+    """
+    One in-flight send, the stack and line it is currently executing are updated by its sender
+    """
+
+    __slots__ = ('id', 'name', 'source', 'user', 'perm', 'started', 'stack', 'line', '_loop', '_task')
+
+    def __init__(self, send_id: int, name: str, source: CommandSource, user: str, perm: int):
+        self.id: int = send_id
+        self.name: str = name
+        self.source: CommandSource = source
+        self.user: str = user
+        self.perm: int = perm
+        self.started: float = time.monotonic()
+        self.stack: str = name
+        self.line: int = 0
+        self._loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self._task: asyncio.Task = asyncio.current_task()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def at(self, stack: str, line: int):
+        self.stack = stack
+        self.line = line
+
+    def cancel(self):
+        self._loop.call_soon_threadsafe(self._task.cancel)
+
+
+class SendRegistry:
+    """
+    In-flight sends by id, a send is registered from the task running it
+    """
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._sends: Dict[int, RunningSend] = {}
+        self._lock = Lock()
+
+    def register(self, name: str, source: CommandSource, user: str, perm: int) -> RunningSend:
+        with self._lock:
+            running = RunningSend(next(self._ids), name, source, user, perm)
+            self._sends[running.id] = running
+        return running
+
+    def unregister(self, running: RunningSend):
+        with self._lock:
+            self._sends.pop(running.id, None)
+
+    def get(self, send_id: int) -> Optional[RunningSend]:
+        with self._lock:
+            return self._sends.get(send_id)
+
+    def running_sends(self) -> List[RunningSend]:
+        with self._lock:
+            return sorted(self._sends.values(), key=lambda r: r.id)
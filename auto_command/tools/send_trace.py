@@ -0,0 +1,48 @@
+from contextvars import ContextVar
+from typing import List, Optional
+
+
+class TraceLine:
+    """
+    Record of one executed line, stacks sent by the line are its children
+    """
+
+    __slots__ = ('line', 'category', 'text', 'elapsed', 'wait', 'condition', 'condition_result', 'children')
+
+    def __init__(self, line: int, category: str, text: str):
+        self.line: int = line
+        self.category: str = category
+        self.text: str = text
+        self.elapsed: float = 0
+        self.wait: float = 0  # seconds spent in !!ac wait and /player pacing
+        self.condition: float = 0  # seconds spent checking if/unless conditions
+        self.condition_result: Optional[bool] = None
+        self.children: List['TraceNode'] = []
+
+
+class TraceNode:
+    """
+    Record of one sent stack
+    """
+
+    __slots__ = ('name', 'elapsed', 'lines')
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.elapsed: float = 0
+        self.lines: List[TraceLine] = []
+
+
+class SendTrace:
+    """
+    Tree of everything executed by one send, in a dry run nothing is sent to the server and nothing is waited for
+    """
+
+    def __init__(self, name: str, dry_run: bool = False):
+        self.name: str = name
+        self.dry_run: bool = dry_run
+        self.root: TraceLine = TraceLine(0, 'send', name)
+
+
+# the line being executed by the running task, stacks it sends are recorded as its children
+current_trace_line: ContextVar[Optional[TraceLine]] = ContextVar('current_trace_line', default=None)
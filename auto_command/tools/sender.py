@@ -1,55 +1,108 @@
-from abc import ABC, abstractmethod
-import re
 import asyncio
+import time
+from typing import Coroutine, Optional, Tuple
 
 from mcdreforged.api.all import *
 
 from auto_command.context import Context
 from auto_command.storage.storage import CommandStackStorage
-from auto_command.exceptions import ACRecursionException, ACUnknownStackException
+from auto_command.exceptions import ACSendFanOutException, ACUnknownStackException
 from auto_command.constant import DEFAULT_WAIT_UNIT, COMMAND_TIMEOUT
 from auto_command.tools.runtime_interpreter import RuntimeInterpreter
+from auto_command.tools.task_group import SendTaskGroup
+from auto_command.tools.send_registry import RunningSend
+from auto_command.tools.call_stack import CallStack, current_call_stack
+from auto_command.tools.send_trace import SendTrace, TraceLine, TraceNode, current_trace_line
+from auto_command.tools.ac_time import ACTime, Duration
+from auto_command.tools.player_pacer import PlayerPacer
+from auto_command.tools.execution_plan import Op, McCommandOp, McCommandBatchOp, PlayerOp, PlayerSpawnOp, McdrCommandOp, SendOp, ParallelOp, WaitOp, MessageOp, DynamicOp
 
 
 class CommandStackSender:
-    def __init__(self, ctx: Context, source: CommandSource, storage: CommandStackStorage):
+    _categories = {
+        McCommandOp: 'mc',
+        McCommandBatchOp: 'mc_batch',
+        PlayerOp: 'player',
+        PlayerSpawnOp: 'player_spawn',
+        McdrCommandOp: 'mcdr',
+        SendOp: 'send',
+        ParallelOp: 'parallel',
+        WaitOp: 'wait',
+        MessageOp: 'message',
+        DynamicOp: 'dynamic',
+    }
+    # ops that reach the server, MCDR or players and are skipped in a dry run
+    _side_effect_ops = (McCommandOp, McCommandBatchOp, PlayerOp, PlayerSpawnOp, McdrCommandOp, MessageOp)
+    _one_tick = Duration(1, True)
+
+    def __init__(self, ctx: Context, source: CommandSource, storage: CommandStackStorage,
+                 running: Optional[RunningSend] = None, trace: Optional[SendTrace] = None):
         self._cfg = ctx.cfg
         self._svc = ctx.svc
         self._utils = ctx.utils
         self._info_getter = ctx.info_getter
         self._time = ctx.time
+        self._plan_cache = ctx.plan_cache
         self._source: CommandSource = source
         self._storage: CommandStackStorage = storage
-        self._prev_send = []
+        self._sent_count: int = 0
+        self._task_group = SendTaskGroup()
+        self._running: Optional[RunningSend] = running
+        self._priority: int = self._cfg.command_queue.default_priority
+        self._trace: Optional[SendTrace] = trace
+        self._dry_run: bool = trace is not None and trace.dry_run
         self._interpreter = RuntimeInterpreter(source, ctx)
 
     async def send_command_stack(self, name: str, condition='', unless=False):
 
         """
         exec_ac_cs(self, name: str)  catch error
-            exec_mcdr_cmd(self, cmd: str)
-                exec_ac_cmd(self, cmd: str)
+            exec_op(self, op: Op)  one compiled line of the stack
+                exec_ac_send(self, op: SendOp)
                     exec_ac_cs(self, name: str)
-                    exec_ac_wait(self, t: float)
                     exec_ac_if(self, name: str, condition: str, unless=False)
-            exec_mc_cmd(self, cmd: str)
+                exec_ac_parallel(self, op: ParallelOp)
+                    exec_ac_cs(self, name: str)  for each stack at the same time
+                exec_ac_wait(self, t: str)
+                exec_mcdr_cmd(self, cmd: str)
+                exec_mc_cmd(self, cmd: str)
+                exec_mc_batch(self, cmds: Tuple[str, ...])
+                exec_player(self, cmd: str, pacer: PlayerPacer)
                 exec_player_spawn(self, cmd: str)
-            exec_msg(self, cmd: str)
+                exec_msg(self, cmd: str)
         """
 
+        self._priority = self._cfg.command_queue.stack_priorities.get(name, self._cfg.command_queue.default_priority)
+        current_call_stack.set(CallStack(self._cfg.send_limit.max_depth))
+        if self._trace is not None:
+            current_trace_line.set(self._trace.root)
         try:
-            if condition == '':
-                await self._exec_ac_cs(name, show_success=False)
-            else:
-                await self._exec_ac_if(name, condition, unless, show_success=False)
-
-            current = asyncio.current_task()
-            await asyncio.gather(*[t for t in asyncio.all_tasks() if t is not current])
+            async with self._task_group:
+                if condition == '':
+                    await self._exec_ac_cs(name, show_success=False)
+                else:
+                    await self._exec_ac_if(name, condition, unless, show_success=False)
+        except asyncio.CancelledError:
+            self._svc.print(self._source, self._svc.tr('send_command_stack.cancelled', name), tell=False)
+            raise
         except Exception as e:
             self._svc.print(self._source, self._svc.tr('send_command_stack.fail', name, self._utils.get_exception_msg(e)))
             self._svc.log_exception('Failed to send command stack {}'.format(name))
         else:
-            self._svc.print(self._source, self._utils.click_info(RText(self._svc.tr('send_command_stack.success', name)), name), tell=False)
+            self._print_success(name, self._task_group.elapsed)
+        finally:
+            if self._trace is not None:
+                self._trace.root.elapsed = self._task_group.elapsed
+
+    @property
+    def task_group(self) -> SendTaskGroup:
+        return self._task_group
+
+    def _print_success(self, name: str, elapsed: float):
+        if self._dry_run:
+            return
+        msg = self._svc.tr('send_command_stack.success', name, round(elapsed, 2))
+        self._svc.print(self._source, self._utils.click_info(RText(msg), name), tell=False)
 
     async def _exec_ac_cs(self, name: str, show_success: bool = True):
         if not self._storage.contains(name):
@@ -59,101 +112,204 @@ class CommandStackSender:
 
         self._svc.req_perm(self._source, stack.perm)
 
-        self._prev_send.append(name)
-        if self._prev_send.count(name) == 2:
-            raise ACRecursionException(name, self._prev_send)
-
-        line = 0
-        for cmd in stack.command:
-            line += 1
-
-            cmd = self._interpreter.interpret(cmd)
-
+        max_fan_out = self._cfg.send_limit.max_fan_out
+        if 0 < max_fan_out <= self._sent_count:
+            raise ACSendFanOutException(max_fan_out)
+        self._sent_count += 1
+
+        node: Optional[TraceNode] = None
+        if self._trace is not None:
+            node = TraceNode(name)
+            current_trace_line.get().children.append(node)
+
+        call_stack = current_call_stack.get()
+        call_stack.push(name)
+        started = time.monotonic()
+        pacing_cfg = self._cfg.player_pacing
+        pacer = PlayerPacer(pacing_cfg.mode, pacing_cfg.window_size, lambda: self._sleep(self._one_tick), self._acknowledge)
+        try:
+            plan = self._plan_cache.get(name, stack.command, self._batch_size(name))
+            next_line = 1
+            for op in plan.ops:
+                line = next_line
+                next_line += len(op.commands) if isinstance(op, McCommandBatchOp) else 1
+                if self._running is not None:
+                    self._running.at(name, line)
+                record: Optional[TraceLine] = None
+                if node is not None:
+                    record = TraceLine(line, self._category(op), '\n'.join(plan.source[line - 1:next_line - 1]))
+                    node.lines.append(record)
+                    token = current_trace_line.set(record)
+                line_started = time.monotonic()
+                try:
+                    await self._exec_op(op, pacer)
+                except Exception as e:
+                    self._svc.print(self._source, self._svc.tr('send_command_stack.fail_line', name, line, self._utils.get_exception_msg(e)))
+                    self._svc.log_exception('Failed sending command in stack: {} line: {}'.format(name, line))
+                finally:
+                    if record is not None:
+                        record.elapsed = time.monotonic() - line_started
+                        current_trace_line.reset(token)
             try:
-                if cmd[:2] == '!!':
-                    await self._exec_mcdr_cmd(cmd)
-                elif cmd[0] == '/':
-                    await self._exec_mc_cmd(cmd)
-                else:
-                    await self._exec_msg(cmd)
+                await pacer.flush()
             except Exception as e:
-                self._svc.print(self._source, self._svc.tr('send_command_stack.fail_line', name, line, self._utils.get_exception_msg(e)))
-                self._svc.log_exception('Failed sending command in stack: {} line: {}'.format(name, line))
+                self._svc.print(self._source, self._svc.tr('send_command_stack.fail_line', name, next_line - 1, self._utils.get_exception_msg(e)))
+                self._svc.log_exception('Failed sending command in stack: {} line: {}'.format(name, next_line - 1))
+        finally:
+            call_stack.pop()
+            if node is not None:
+                node.elapsed = time.monotonic() - started
         if show_success:
-            self._svc.print(self._source, self._utils.click_info(RText(self._svc.tr('send_command_stack.success', name)), name), tell=False)
+            self._print_success(name, time.monotonic() - started)
+
+    def _category(self, op: Op) -> str:
+        if isinstance(op, (SendOp, ParallelOp)) and op.is_async:
+            return self._categories[type(op)] + '_async'
+        return self._categories[type(op)]
+
+    async def _exec_op(self, op: Op, pacer: PlayerPacer):
+        if isinstance(op, DynamicOp):
+            text = self._interpreter.interpret(op.text)
+            op = self._plan_cache.compiler.compile_line(text, interpreted=True)
+            if self._trace is not None:
+                record = current_trace_line.get()
+                record.text = text
+                record.category = self._category(op)
+
+        if self._dry_run and isinstance(op, self._side_effect_ops):
+            return
+        if not isinstance(op, PlayerOp):
+            await pacer.flush()
+
+        if isinstance(op, McCommandOp):
+            await self._exec_mc_cmd(op.command)
+        elif isinstance(op, McCommandBatchOp):
+            await self._exec_mc_batch(op.commands)
+        elif isinstance(op, PlayerOp):
+            await self._exec_player(op.command, pacer)
+        elif isinstance(op, PlayerSpawnOp):
+            await self._exec_player_spawn(op.command)
+        elif isinstance(op, SendOp):
+            await self._exec_ac_send(op)
+        elif isinstance(op, ParallelOp):
+            await self._exec_ac_parallel(op)
+        elif isinstance(op, WaitOp):
+            await self._exec_ac_wait(op)
+        elif isinstance(op, McdrCommandOp):
+            await self._exec_mcdr_cmd(op.command)
+        else:
+            await self._exec_msg(op.text)
 
     async def _exec_mcdr_cmd(self, cmd: str):
+        self._svc.exec_mcdr_cmd(self._source, cmd)
 
-        """
-        exec_ac_cmd(self, cmd: str)
-        """
-
-        match_ac = re.match(r'^{}'.format(self._cfg.prefix), cmd)
+    def _batch_size(self, name: str) -> int:
+        batch_cfg = self._cfg.command_batch
+        return max(1, batch_cfg.stack_sizes.get(name, batch_cfg.default_size))
 
-        if match_ac:
-            await self._exec_ac_cmd(cmd)
-        else:
-            self._svc.exec_mcdr_cmd(self._source, cmd)
+    async def _queue_mc_cmd(self, cmd: str):
+        await asyncio.wrap_future(self._svc.queue_mc_cmd(cmd, self._priority))
 
     async def _exec_mc_cmd(self, cmd: str):
-        match_player = re.match(r'^/player .+', cmd)
-        if match_player:
-            await self._exec_player(cmd)
-        else:
-            self._svc.exec_mc_cmd(cmd)
+        await self._queue_mc_cmd(cmd)
 
-    async def _exec_player(self, cmd: str):
-        match_player_spawn = re.match(r'^/player (.*) spawn', cmd)
-        if match_player_spawn:
-            await self._exec_player_spawn(cmd)
-        else:
-            self._svc.exec_mc_cmd(cmd)
-            await self._time.sleep('1', 't')
+    async def _exec_mc_batch(self, cmds: Tuple[str, ...]):
+        await asyncio.wrap_future(self._svc.queue_mc_cmds(cmds, self._priority))
+
+    async def _exec_player(self, cmd: str, pacer: PlayerPacer):
+        await self._queue_mc_cmd(cmd)
+        await pacer.sent()
 
     async def _exec_player_spawn(self, cmd: str):
         cmd = self._utils.interpret_player_spawn(self._source, cmd)
-        self._svc.exec_mc_cmd(cmd)
+        await self._queue_mc_cmd(cmd)
 
     async def _exec_msg(self, cmd: str):
         self._svc.print(self._source, cmd, tell=False)
 
-    async def _exec_ac_cmd(self, cmd: str):
-
-        """
-        exec_ac_cs(self, name: str)
-        exec_ac_if(self, name: str, condition: str, unless=False)
-        exec_ac_wait(self, t: float)
-        """
+    async def _exec_ac_send(self, op: SendOp):
+        if op.condition_type is None:
+            func = self._exec_ac_cs(op.name)
+        else:
+            func = self._exec_ac_if(op.name, op.condition, op.condition_type == 'unless')
 
-        match_send = re.match(r'^{} send ("[^"]+"|\S+)(?:\s+(async))?(?:\s+(if|unless)\s+(.+))?$'.format(self._cfg.prefix), cmd)
-        match_wait = re.match(r'^{} wait (\S+)'.format(self._cfg.prefix), cmd)
-        if match_send:
-            cs_name = match_send.group(1)
-            is_async = match_send.group(2) == 'async'
-            condition_type = match_send.group(3)  # 'if' or 'unless' or None
-            condition_value = match_send.group(4)
+        if op.is_async:
+            self._task_group.spawn(op.name, self._forked(func, current_call_stack.get().copy()))
+        else:
+            await func
+
+    async def _exec_ac_parallel(self, op: ParallelOp):
+        timeout = None
+        if op.timeout is not None:
+            # a malformed time is parsed again for the exception
+            timeout = (op.timeout_duration or ACTime.parse(op.timeout, DEFAULT_WAIT_UNIT)).seconds
+        func = self._run_parallel(op.names, timeout)
+        if op.is_async:
+            self._task_group.spawn(' '.join(op.names), self._forked(func, current_call_stack.get().copy()))
+        else:
+            await func
 
-            if cs_name.startswith('"') and cs_name.endswith('"'):
-                cs_name = cs_name[1:-1]
+    async def _run_parallel(self, names: Tuple[str, ...], timeout: Optional[float]):
+        call_stack = current_call_stack.get()
+        tasks = {asyncio.create_task(self._forked(self._exec_parallel_cs(name), call_stack.copy())): name for name in names}
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
+            timed_out = ', '.join(tasks[task] for task in tasks if task in pending)
+            self._svc.print(self._source, self._svc.tr('send_command_stack.parallel_timeout', timed_out), tell=False)
+
+    async def _exec_parallel_cs(self, name: str):
+        # a failing stack doesn't stop the others in the block
+        try:
+            await self._exec_ac_cs(name)
+        except Exception as e:
+            self._svc.print(self._source, self._svc.tr('send_command_stack.fail', name, self._utils.get_exception_msg(e)))
+            self._svc.log_exception('Failed to send command stack {}'.format(name))
 
-            func = self._exec_ac_cs(cs_name)
-            if condition_type == 'if' or condition_type == 'unless':
-                func = self._exec_ac_if(cs_name, condition_value, condition_type == 'unless')
+    @staticmethod
+    async def _forked(coro: Coroutine, call_stack: CallStack):
+        # the task runs in a copy of the current context, it continues on a copy of the chain taken when it is spawned
+        current_call_stack.set(call_stack)
+        await coro
 
-            if is_async:
-                asyncio.create_task(func)
-            else:
-                await func
+    async def _exec_ac_if(self, name: str, condition: str, unless=False, show_success=True):
+        if self._dry_run:
+            # checking the condition runs commands on the server, a dry run follows the send unconditionally
+            await self._exec_ac_cs(name, show_success)
+            return
+
+        started = time.monotonic()
+        result = await self._info_getter.if_condition(COMMAND_TIMEOUT, condition, unless)
+        if self._trace is not None:
+            record = current_trace_line.get()
+            record.condition += time.monotonic() - started
+            record.condition_result = result
+        if result:
+            await self._exec_ac_cs(name, show_success)
 
-        elif match_wait:
-            await self._exec_ac_wait(match_wait.group(1))
+    async def _exec_ac_wait(self, op: WaitOp):
+        # a malformed time is parsed again for the exception
+        await self._sleep(op.duration or ACTime.parse(op.time, DEFAULT_WAIT_UNIT))
 
-        else:
-            self._svc.exec_mcdr_cmd(self._source, cmd)
+    async def _acknowledge(self):
+        started = time.monotonic()
+        await self._time.acknowledge()
+        if self._trace is not None:
+            current_trace_line.get().wait += time.monotonic() - started
 
-    async def _exec_ac_if(self, name: str, condition: str, unless=False, show_success=True):
-        if self._info_getter.if_condition(COMMAND_TIMEOUT, condition, unless):
-            await self._exec_ac_cs(name, show_success)
+    async def _sleep(self, duration: Duration):
+        if self._dry_run:
+            return
 
-    async def _exec_ac_wait(self, t: str):
-        await self._time.sleep(t, DEFAULT_WAIT_UNIT)
+        started = time.monotonic()
+        await self._time.sleep(duration)
+        if self._trace is not None:
+            current_trace_line.get().wait += time.monotonic() - started
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Coroutine, List, Optional
+
+
+class SubSend:
+    __slots__ = ('name', 'task', 'started', 'finished')
+
+    def __init__(self, name: str, task: asyncio.Task):
+        self.name: str = name
+        self.task: asyncio.Task = task
+        self.started: float = time.monotonic()
+        self.finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished if self.finished is not None else time.monotonic()) - self.started
+
+
+class SendTaskGroup:
+    """
+    Async sub-sends started by one send, leaving the group waits for all of them (including the ones
+    started by sub-sends meanwhile) and raises the first error, leaving it with an error or by
+    cancellation cancels them instead
+
+    Only tasks spawned here are waited for, so sends sharing a loop don't wait on each other
+    """
+
+    def __init__(self):
+        self._sub_sends: List[SubSend] = []
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    @property
+    def sub_sends(self) -> List[SubSend]:
+        return list(self._sub_sends)
+
+    @property
+    def elapsed(self) -> float:
+        if self._started is None:
+            return 0
+        return (self._finished if self._finished is not None else time.monotonic()) - self._started
+
+    def spawn(self, name: str, coro: Coroutine) -> asyncio.Task:
+        sub_send = SubSend(name, asyncio.create_task(coro))
+
+        def on_done(_):
+            sub_send.finished = time.monotonic()
+
+        sub_send.task.add_done_callback(on_done)
+        self._sub_sends.append(sub_send)
+        return sub_send.task
+
+    def cancel(self):
+        for sub_send in self._sub_sends:
+            sub_send.task.cancel()
+
+    async def __aenter__(self) -> 'SendTaskGroup':
+        self._started = time.monotonic()
+        self._finished = None
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                self.cancel()
+            await self._join()
+        except asyncio.CancelledError:
+            self.cancel()
+            await asyncio.gather(*[s.task for s in self._sub_sends], return_exceptions=True)
+            raise
+        finally:
+            self._finished = time.monotonic()
+        if exc_type is None:
+            for sub_send in self._sub_sends:
+                if not sub_send.task.cancelled() and sub_send.task.exception() is not None:
+                    raise sub_send.task.exception()
+        return False
+
+    async def _join(self):
+        while True:
+            pending = [s.task for s in self._sub_sends if not s.task.done()]
+            if not pending:
+                return
+            await asyncio.wait(pending)
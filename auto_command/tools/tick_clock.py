@@ -0,0 +1,155 @@
+import heapq
+import itertools
+import time
+from threading import Condition, Thread
+from typing import Callable, List, Optional, Tuple
+
+from auto_command.tools.tick_data_getter import TickDataGetter
+from auto_command.tools.query_task import _async_waiter
+from auto_command.exceptions import ACGetGametickTimeoutException
+from auto_command.constant import COMMAND_TIMEOUT
+
+
+class TickWaiter:
+    __slots__ = ('ticks', 'target', 'callback', 'cancelled', '_clock')
+
+    def __init__(self, clock: 'TickClock', ticks: int, callback: Callable[[Optional[Exception]], None]):
+        self.ticks: int = ticks
+        self.target: Optional[int] = None  # set by the first gametime poll after registering
+        self.callback: Callable[[Optional[Exception]], None] = callback
+        self.cancelled: bool = False
+        self._clock: 'TickClock' = clock
+
+    def cancel(self):
+        self._clock.cancel(self)
+
+
+class TickClock:
+    """
+    Shared gametick clock, every tick waiter is served by the gametime polls of one thread
+
+    A waiter of n ticks gets its target from the first poll after it registers, that poll takes about a tick
+    so the target is that gametick + n - 1. The thread sleeps until the estimated time of the earliest target,
+    polls once and wakes every waiter that is due, so the query traffic doesn't grow with the number of waiters
+    """
+
+    _min_tps = 1.0
+    _max_tps = 1000.0
+    _min_measured_ticks = 3
+    _tps_ttl = 30.0  # seconds an estimate is trusted for
+
+    def __init__(self, tick_data_getter: TickDataGetter, log_callback: Callable[[str], None]):
+        self._tick_data_getter = tick_data_getter
+        self._log_callback = log_callback
+        self._cond = Condition()
+        self._new: List[TickWaiter] = []
+        self._heap: List[Tuple[int, int, TickWaiter]] = []
+        self._seq = itertools.count()
+        self._gametick: Optional[int] = None
+        self._polled: float = 0
+        self._tps: float = 20
+        self._tps_updated: float = -self._tps_ttl
+        self._thread: Optional[Thread] = None
+
+    @property
+    def tps(self) -> float:
+        return self._tps
+
+    def call_after_ticks(self, ticks: int, callback: Callable[[Optional[Exception]], None]) -> TickWaiter:
+        """
+        :param callback: Called on the clock thread with None, or with the exception if the gametime could not be got
+        """
+        waiter = TickWaiter(self, max(1, ticks), callback)
+        with self._cond:
+            self._new.append(waiter)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._thread_main, name='AutoCommand-TickClock', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return waiter
+
+    async def sleep_ticks(self, ticks: int):
+        future, callback = _async_waiter()
+        waiter = self.call_after_ticks(ticks, callback)
+        try:
+            error: Optional[Exception] = await future
+        finally:
+            waiter.cancel()
+        if error is not None:
+            raise error
+
+    def cancel(self, waiter: TickWaiter):
+        with self._cond:
+            waiter.cancelled = True
+            self._cond.notify_all()
+
+    def _update_tps(self):
+        tps = self._tick_data_getter.get_tps(timeout=COMMAND_TIMEOUT)
+        if tps is not None:
+            self._tps = min(self._max_tps, max(self._min_tps, tps))
+        # a server without the tps command isn't asked again until the estimate is stale
+        self._tps_updated = time.monotonic()
+
+    def _poll(self) -> Optional[int]:
+        gametick = self._tick_data_getter.get_gametick(timeout=COMMAND_TIMEOUT)
+        now = time.monotonic()
+        if gametick is not None:
+            if self._gametick is not None and gametick - self._gametick >= self._min_measured_ticks and now - self._polled < self._tps_ttl:
+                # measured over the last sleep, a frozen or lagging server slows the clock down
+                self._tps = min(self._max_tps, max(self._min_tps, (gametick - self._gametick) / (now - self._polled)))
+                self._tps_updated = now
+            self._gametick = gametick
+            self._polled = now
+        return gametick
+
+    def _thread_main(self):
+        while True:
+            query_tps: bool = False
+            with self._cond:
+                self._new = [w for w in self._new if not w.cancelled]
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._new and not self._heap:
+                    self._thread = None
+                    return
+                if not self._new:
+                    target = self._heap[0][0]
+                    now = time.monotonic()
+                    if target - self._gametick > self._min_measured_ticks and self._tick_data_getter.tps_gettable and now - self._tps_updated > self._tps_ttl:
+                        query_tps = True
+                    else:
+                        # sleep until the earliest target is estimated to be a tick away, the poll takes that tick
+                        delay = (target - self._gametick - 1) / self._tps - (now - self._polled)
+                        if delay > 0:
+                            self._cond.wait(delay)
+                            continue
+                if not query_tps:
+                    # waiters registering during the poll wait for the next one, it may have been sent before their commands
+                    pending, self._new = self._new, []
+
+            if query_tps:
+                self._update_tps()
+                continue
+
+            gametick = self._poll()
+
+            with self._cond:
+                due: List[TickWaiter] = []
+                if gametick is None:
+                    due = pending + [entry[2] for entry in self._heap]
+                    self._heap.clear()
+                else:
+                    for waiter in pending:
+                        waiter.target = gametick + waiter.ticks - 1
+                        heapq.heappush(self._heap, (waiter.target, next(self._seq), waiter))
+                    while self._heap and self._heap[0][0] <= gametick:
+                        due.append(heapq.heappop(self._heap)[2])
+
+            error = ACGetGametickTimeoutException() if gametick is None else None
+            for waiter in due:
+                if waiter.cancelled:
+                    continue
+                try:
+                    waiter.callback(error)
+                except Exception as e:
+                    self._log_callback(f'Fail to wake tick waiter: {e}')
@@ -0,0 +1,133 @@
+"""
+Compares the compiled ACTime grammar with the regex-per-unit parser it replaced
+
+Run from the repository root: python -m benchmarks.ac_time
+"""
+import re
+import timeit
+from functools import lru_cache
+from typing import Dict
+
+from auto_command.tools.ac_time import ACTime
+
+TIMES = ['5', '20t', '1.5s', '2min', '1h', '0', '3d', '1w']
+INTERVALS = [TIMES[i % len(TIMES)] for i in range(1000)]
+
+
+class LegacyACTime:
+    """
+    The parser before Duration, kept here only to compare against
+    """
+
+    _format: Dict[str, str] = {
+        'tick': r"^(\d+)(?i:tick|t)",
+        'second': r"^(\d+\.\d+|\.\d+|\d+)(?i:second|sec|s)",
+        'minute': r"^(\d+\.\d+|\.\d+|\d+)(?i:minute|min|m)",
+        'hour': r"^(\d+\.\d+|\.\d+|\d+)(?i:hour|hr|h)",
+        'day': r"^(\d+\.\d+|\.\d+|\d+)(?i:day|d)",
+        'week': r"^(\d+\.\d+|\.\d+|\d+)(?i:week|wk|w)",
+    }
+    _factors: Dict[str, float] = {'second': 1, 'minute': 60, 'hour': 60 * 60, 'day': 60 * 60 * 24, 'week': 60 * 60 * 24 * 7}
+
+    @classmethod
+    def is_time_format(cls, time: str) -> bool:
+        if re.fullmatch(r'^(?:\d+\.\d+|\.\d+|\d+)$', time):
+            return True
+        for pattern in cls._format.values():
+            if re.fullmatch(pattern, time):
+                return True
+        return False
+
+    @staticmethod
+    def to_time(time: str, postfix: str) -> str:
+        if re.fullmatch(r'^(?:\d+\.\d+|\.\d+|\d+)$', time):
+            time += postfix
+        return time
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_number(time: str) -> float:
+        if m := re.match(r'^(\d+\.\d+|\.\d+|\d+)', time):
+            return float(m.group(1))
+
+    @staticmethod
+    def is_zero(time: str) -> bool:
+        return LegacyACTime.get_number(time) == 0
+
+    @staticmethod
+    def not_zero(time: str) -> bool:
+        return LegacyACTime.get_number(time) != 0
+
+    @classmethod
+    def time_to_s(cls, time: str) -> tuple[float, bool]:
+        for unit, pattern in cls._format.items():
+            match = re.fullmatch(pattern, time)
+            if match:
+                n = float(match.group(1))
+                return (n, False) if unit == 'tick' else (n * cls._factors[unit], True)
+
+
+def legacy_wait():
+    for t in TIMES:
+        t = LegacyACTime.to_time(t, 's')
+        LegacyACTime.is_time_format(t)
+        LegacyACTime.time_to_s(t)
+
+
+def wait():
+    for t in TIMES:
+        ACTime.parse(t, 's')
+
+
+def legacy_restart():
+    for t in TIMES:
+        t = LegacyACTime.to_time(t, 'm')
+        LegacyACTime.is_time_format(t)
+        LegacyACTime.is_zero(t)
+        LegacyACTime.time_to_s(t)
+
+
+def restart():
+    for t in TIMES:
+        _ = ACTime.parse(t, 'm').is_zero
+
+
+def legacy_scan():
+    return [t for t in INTERVALS if LegacyACTime.not_zero(t)]
+
+
+def scan():
+    return [t for t in INTERVALS if ACTime.not_zero(t)]
+
+
+def uncached(func):
+    def run():
+        ACTime.try_parse.cache_clear()
+        ACTime.is_zero.cache_clear()
+        ACTime.not_zero.cache_clear()
+        LegacyACTime.get_number.cache_clear()
+        func()
+    return run
+
+
+def best(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    for name, legacy, new, number in [
+        ('wait x8', legacy_wait, wait, 20000),
+        ('interval restart x8', legacy_restart, restart, 20000),
+        ('timed scan x1000', legacy_scan, scan, 200),
+    ]:
+        old_us = best(legacy, number)
+        cached_us = best(new, number)
+        uncached_us = best(uncached(new), number)
+        print(
+            f'{name:20} old {old_us:8.1f} us  new cached {cached_us:7.1f} us ({old_us / cached_us:5.1f}x)'
+            f'  new uncached {uncached_us:7.1f} us ({old_us / uncached_us:4.1f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
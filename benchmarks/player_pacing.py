@@ -0,0 +1,64 @@
+"""
+Compares the player_pacing modes on a run of /player commands, fixed is the one tick per command used before
+
+The server is simulated with a 20 tps gametime, a gametime query is answered at the end of the tick it is sent in
+
+Run from the repository root: python -m benchmarks.player_pacing
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from auto_command.tools.ac_time import ACTime, Duration
+from auto_command.tools.player_pacer import PlayerPacer
+from auto_command.tools.tick_clock import TickClock
+
+TICK = 0.05
+COMMANDS = 50
+WINDOW_SIZE = 8
+
+
+class SimulatedTickDataGetter:
+    tps_gettable = False
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self.queries = 0
+
+    def get_gametick(self, timeout: float) -> Optional[int]:
+        with self._lock:
+            self.queries += 1
+        gametick = int((time.monotonic() - self._started) / TICK) + 1
+        time.sleep(self._started + gametick * TICK - time.monotonic())
+        return gametick
+
+    def get_tps(self, timeout: float) -> Optional[float]:
+        return None
+
+
+async def send_run(pacer: PlayerPacer):
+    for _ in range(COMMANDS):
+        await pacer.sent()
+    await pacer.flush()
+
+
+def run(mode: str):
+    getter = SimulatedTickDataGetter()
+    ac_time = ACTime(TickClock(getter, print))
+    one_tick = Duration(1, True)
+    pacer = PlayerPacer(mode, WINDOW_SIZE, lambda: ac_time.sleep(one_tick), ac_time.acknowledge)
+    started = time.monotonic()
+    asyncio.run(send_run(pacer))
+    elapsed = time.monotonic() - started
+    print(f'{mode:7} {COMMANDS} /player lines: {elapsed * 1000:7.0f} ms, {getter.queries:2d} gametime queries')
+
+
+def main():
+    for mode in PlayerPacer.MODES:
+        run(mode)
+
+
+if __name__ == '__main__':
+    main()
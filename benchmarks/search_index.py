@@ -0,0 +1,54 @@
+"""
+Compares SearchIndex with the substring scan search_stack used before it
+
+Run from the repository root: python -m benchmarks.search_index
+"""
+import random
+import string
+import timeit
+from typing import Dict, List, Optional
+
+from auto_command.storage.search_index import SearchIndex
+
+KEYWORDS = ['ab', 'farm', 'xqz', 'iron_farm', 'stack_4242', 'nothing_like_this']
+
+
+def linear_search(stacks: Dict[str, Optional[str]], keyword: str) -> List[str]:
+    matched_names = []
+    for name in stacks:
+        desc = stacks[name]
+        if name.find(keyword) != -1 or (desc is not None and desc.find(keyword) != -1):
+            matched_names.append(name)
+    return matched_names
+
+
+def make_stacks(count: int) -> Dict[str, Optional[str]]:
+    rng = random.Random(count)
+    words = ['iron', 'farm', 'gold', 'bot', 'tnt', 'duper', 'spawn', 'wither', 'raid', 'afk']
+    stacks = {}
+    for i in range(count):
+        name = '{}_{}_{}'.format(rng.choice(words), rng.choice(words), i)
+        if i % 100 == 42:
+            name = f'stack_{i}'
+        desc = ' '.join(rng.choice(words) + ''.join(rng.choices(string.ascii_lowercase, k=2)) for _ in range(4))
+        stacks[name] = desc if i % 5 else None
+    return stacks
+
+
+def main():
+    for count in (10_000, 100_000):
+        stacks = make_stacks(count)
+        index = SearchIndex()
+        build = timeit.timeit(lambda: [index.add(name, desc) for name, desc in stacks.items()], number=1)
+        print(f'{count} stacks, index built in {build * 1000:.0f} ms')
+        for keyword in KEYWORDS:
+            assert index.search(keyword) == linear_search(stacks, keyword), keyword
+            number = 20 if count <= 10_000 else 5
+            linear = min(timeit.repeat(lambda: linear_search(stacks, keyword), number=number, repeat=3)) / number
+            indexed = min(timeit.repeat(lambda: index.search(keyword), number=number, repeat=3)) / number
+            hits = len(index.search(keyword))
+            print(f'  {keyword!r:20} {hits:6d} hits  scan {linear * 1000:8.2f} ms  index {indexed * 1000:8.3f} ms  ({linear / indexed:6.1f}x)')
+
+
+if __name__ == '__main__':
+    main()